@@ -0,0 +1,118 @@
+from typing import Callable, List, Optional, Tuple
+from dotenv import load_dotenv
+from chromadb import PersistentClient
+import hashlib
+import os
+import time
+from ..VectorSearch.embedding_cache import embedding_cache, normalize_query
+
+load_dotenv()
+
+class AnswerCache:
+    """
+    Chatbot answers kept in a Chroma collection and looked up by query similarity.
+
+    Each entry is the normalized query (as the document and its embedding) with
+    the answer, the time it was stored and the model that wrote it as metadata.
+    An exact repeat of a query is found by id without calling the embedding
+    API; anything else is embedded once and matched against the nearest stored
+    query, and answered from the cache when the cosine similarity reaches the
+    threshold. Entries older than ttl, or written by another model, never match
+    and are pruned at most once per prune_interval.
+    """
+
+    def __init__(self, path: str, collection_name: str, model_name: str, embed: Callable[[str], List[float]] = embedding_cache.embed,
+                 threshold: float = 0.92, ttl: float = 86400.0, prune_interval: float = 3600.0):
+        self.path = path
+        self.collection_name = collection_name
+        self.model_name = model_name
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._collection = None
+        self._pruned_at = 0.0
+
+    @property
+    def collection(self):
+        # Opened on first use so importing the chatbot does not touch the database
+        if self._collection is None:
+            client = PersistentClient(path=self.path)
+            self._collection = client.get_or_create_collection(
+                name=self.collection_name, metadata={"hnsw:space": "cosine"}
+            )
+        return self._collection
+
+    @staticmethod
+    def _entry_id(normalized: str) -> str:
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+    def _fresh(self) -> dict:
+        return {"$and": [{"created_at": {"$gte": time.time() - self.ttl}}, {"model": self.model_name}]}
+
+    def lookup(self, query: str) -> Tuple[Optional[str], float, Optional[List[float]]]:
+        """
+        Cached answer for query, or None, with the similarity of the best match.
+
+        Also returns the query's embedding (None for an exact hit) so that a
+        miss can be stored without embedding the query again.
+        """
+        normalized = normalize_query(query)
+        exact = self.collection.get(ids=[self._entry_id(normalized)], where=self._fresh(), include=["metadatas"])
+        if exact["ids"]:
+            return exact["metadatas"][0]["answer"], 1.0, None
+
+        embedding = self.embed(query)
+        result = self.collection.query(
+            query_embeddings=[embedding], n_results=1, where=self._fresh(), include=["metadatas", "distances"]
+        )
+        if not result["ids"][0]:
+            return None, 0.0, embedding
+        similarity = 1.0 - result["distances"][0][0]
+        if similarity < self.threshold:
+            return None, similarity, embedding
+        return result["metadatas"][0][0]["answer"], similarity, embedding
+
+    def store(self, query: str, answer: str, embedding: Optional[List[float]] = None):
+        normalized = normalize_query(query)
+        if embedding is None:
+            embedding = self.embed(query)
+        self.collection.upsert(
+            ids=[self._entry_id(normalized)],
+            documents=[normalized],
+            embeddings=[embedding],
+            metadatas=[{"answer": answer, "created_at": time.time(), "model": self.model_name}]
+        )
+        self._prune()
+
+    def _prune(self):
+        now = time.time()
+        if now - self._pruned_at < self.prune_interval:
+            return
+        self._pruned_at = now
+        self.collection.delete(where={"$or": [{"created_at": {"$lt": now - self.ttl}}, {"model": {"$ne": self.model_name}}]})
+
+    def invalidate(self, query: Optional[str] = None) -> int:
+        """Drop the entry for query, or every entry; returns how many were dropped"""
+        if query is not None:
+            entry_id = self._entry_id(normalize_query(query))
+            found = len(self.collection.get(ids=[entry_id], include=[])["ids"])
+            self.collection.delete(ids=[entry_id])
+            return found
+        ids = self.collection.get(include=[])["ids"]
+        if ids:
+            self.collection.delete(ids=ids)
+        return len(ids)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+# Global instance, next to fintech_docs in the same Chroma store
+answer_cache = AnswerCache(
+    path="./db",
+    collection_name=os.getenv("ANSWER_CACHE_COLLECTION", "chatbot_answers"),
+    model_name=os.getenv("CHATBOT_MODEL", "gemini-1.5-flash"),
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+    prune_interval=float(os.getenv("ANSWER_CACHE_PRUNE_INTERVAL", "3600"))
+)
@@ -1,26 +1,69 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import Optional
-from .helper import finance_chatbot
+import asyncio
+import json
+from .helper import finance_chatbot, finance_chatbot_stream
 from .session_manager import session_manager
+from .answer_cache import answer_cache
 
 router = APIRouter()
 
 @router.get("/chat")
-async def chat(query: str, session_id: Optional[str] = None):
+async def chat(query: str, session_id: Optional[str] = None, cache: bool = True):
     try:
         # Create new session if not provided
         if not session_id:
-            session_id = session_manager.create_session()
+            session_id = await asyncio.to_thread(session_manager.create_session)
         
-        result = finance_chatbot(query, session_id)
+        # Session storage and the model call block; run them off the event loop
+        result, usage = await asyncio.to_thread(finance_chatbot, query, session_id, use_cache=cache)
         
         return {
             "response": result,
-            "session_id": session_id
+            "session_id": session_id,
+            "usage": usage
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/chat/stream")
+async def chat_stream(query: str, session_id: Optional[str] = None, cache: bool = True):
+    """
+    Same as /chat, but the answer is sent as Server-Sent Events while it is generated.
+    
+    A "session" event with the session id comes first, then "token" events with
+    pieces of the answer, then "done" with the prompt size. If generation fails an "error" event ends
+    the stream and nothing is added to the session history.
+    """
+    if not session_id:
+        session_id = await asyncio.to_thread(session_manager.create_session)
+    
+    async def events():
+        usage = {}
+        yield f"event: session\ndata: {json.dumps({'session_id': session_id})}\n\n"
+        try:
+            async for text in finance_chatbot_stream(query, session_id, usage, use_cache=cache):
+                yield f"event: token\ndata: {json.dumps({'text': text})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+        yield f"event: done\ndata: {json.dumps({'session_id': session_id, 'usage': usage})}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.delete("/chat/cache")
+async def clear_answer_cache(query: Optional[str] = None):
+    """Drop the cached answer for query, or every cached answer"""
+    try:
+        return {"removed": answer_cache.invalidate(query)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/new-session")
 async def new_session():
     session_id = session_manager.create_session()
@@ -1,85 +1,271 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel
+from dotenv import load_dotenv
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from .term_matcher import TermMatcher, tokenize
+
+load_dotenv()
 
 class FinancialTerm(BaseModel):
     term: str
     definition: str
     category: str  # stock, general, technical, etc.
 
+class Glossary:
+    """
+    One loaded version of the glossary, stored column-wise.
+
+    Terms are kept as plain string lists plus a category code per term, and
+    FinancialTerm objects are only created for results. The detector, the
+    inverted index and the lookup tables are each built the first time they
+    are needed, so loading costs no more than reading the file; warm() builds
+    them all up front instead.
+    """
+
+    def __init__(self, names: List[str], definitions: List[str], categories: List[str]):
+        self.names = names
+        self.definitions = definitions
+        self.category_labels = sorted(set(categories))
+        label_codes = {label: code for code, label in enumerate(self.category_labels)}
+        self.category_codes = np.array([label_codes[c] for c in categories], dtype=np.int32)
+        self._lookup: Optional[Dict[str, int]] = None
+        self._category_ids: Optional[List[np.ndarray]] = None
+        self._matcher: Optional[TermMatcher] = None
+        self._vocabulary: Dict[str, int] = {}
+        self._ids: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._words: List[str] = []
+        self._grams: Optional[Dict[str, List[str]]] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def term(self, term_id: int) -> FinancialTerm:
+        return FinancialTerm(
+            term=self.names[term_id],
+            definition=self.definitions[term_id],
+            category=self.category_labels[self.category_codes[term_id]]
+        )
+
+    @property
+    def lookup(self) -> Dict[str, int]:
+        if self._lookup is None:
+            self._lookup = {}
+            for term_id, name in enumerate(self.names):
+                self._lookup.setdefault(name.lower(), term_id)
+        return self._lookup
+
+    @property
+    def matcher(self) -> TermMatcher:
+        if self._matcher is None:
+            self._matcher = TermMatcher(self.names)
+        return self._matcher
+
+    def category_ids(self, code: int) -> np.ndarray:
+        """Ids of the terms in one category, in glossary order"""
+        if self._category_ids is None:
+            order = np.argsort(self.category_codes, kind='stable').astype(np.int32)
+            counts = np.bincount(self.category_codes, minlength=len(self.category_labels))
+            self._category_ids = np.split(order, np.cumsum(counts)[:-1])
+        return self._category_ids[code]
+
+    def warm(self):
+        """Build every index now rather than on first use"""
+        self.lookup
+        self.matcher
+        if self.category_labels:
+            self.category_ids(0)
+        if self._ids is None:
+            self._build_postings()
+        if self._grams is None:
+            self._build_grams()
+
+    def _build_postings(self):
+        """Word -> term ids inverted index, stored as one sorted id array sliced by per-word offsets"""
+        words: List[str] = []
+        counts: List[int] = []
+        for name, definition in zip(self.names, self.definitions):
+            term_words = tokenize(f"{name} {definition}")
+            words.extend(term_words)
+            counts.append(len(term_words))
+        self._vocabulary = {word: code for code, word in enumerate(dict.fromkeys(words))}
+        codes = np.fromiter(map(self._vocabulary.__getitem__, words), dtype=np.int64, count=len(words))
+        term_ids = np.repeat(np.arange(len(self.names), dtype=np.int64), counts)
+        # One sort of (word, term) pairs both groups ids by word and drops repeats within a term
+        stride = max(len(self.names), 1)
+        pairs = np.sort(codes * stride + term_ids)
+        pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+        self._ids = (pairs % stride).astype(np.int32)
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(pairs // stride, minlength=len(self._vocabulary)))))
+        self._words = sorted(self._vocabulary)
+
+    def word_ids(self, word: str) -> np.ndarray:
+        """Sorted ids of the terms whose name or definition contains word"""
+        if self._ids is None:
+            self._build_postings()
+        code = self._vocabulary.get(word)
+        if code is None:
+            return np.empty(0, dtype=np.int32)
+        return self._ids[self._offsets[code]:self._offsets[code + 1]]
+
+    def _build_grams(self):
+        """Trigram -> vocabulary words containing it, to find words by any part of them"""
+        if self._ids is None:
+            self._build_postings()
+        grams: Dict[str, List[str]] = {}
+        for word in self._words:
+            for gram in {word[i:i + 3] for i in range(len(word) - 2)}:
+                grams.setdefault(gram, []).append(word)
+        self._grams = grams
+
+    def substring_ids(self, fragment: str) -> np.ndarray:
+        """Sorted ids of the terms containing a word that has fragment anywhere in it"""
+        if self._grams is None:
+            self._build_grams()
+        if len(fragment) < 3:
+            candidates = self._words
+        else:
+            # Every match holds each trigram of fragment, so the rarest one narrows the scan the most
+            grams = [fragment[i:i + 3] for i in range(len(fragment) - 2)]
+            candidates = min((self._grams.get(gram, []) for gram in grams), key=len)
+        matches = [self.word_ids(word) for word in candidates if fragment in word]
+        return np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int32)
+
+def _load_jsonl(path: str) -> Tuple[List[str], List[str], List[str]]:
+    names, definitions, categories = [], [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            names.append(entry['term'])
+            definitions.append(entry['definition'])
+            categories.append(entry.get('category', 'general'))
+    return names, definitions, categories
+
+def _load_sqlite(path: str) -> Tuple[List[str], List[str], List[str]]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT term, definition, COALESCE(category, 'general') FROM financial_terms ORDER BY rowid").fetchall()
+    finally:
+        conn.close()
+    names, definitions, categories = (list(column) for column in zip(*rows)) if rows else ([], [], [])
+    return names, definitions, categories
+
+def load_glossary(path: str) -> Glossary:
+    """Read a glossary from JSONL (term, definition, category per line) or a SQLite financial_terms table"""
+    loader = _load_sqlite if path.endswith(('.sqlite', '.sqlite3', '.db')) else _load_jsonl
+    return Glossary(*loader(path))
+
 class FinancialKnowledgeBase:
-    def __init__(self):
-        self.terms: Dict[str, FinancialTerm] = self._initialize_terms()
-    
-    def _initialize_terms(self) -> Dict[str, FinancialTerm]:
-        """Initialize with some common financial terms"""
-        terms_data = [
-            {
-                "term": "P/E Ratio",
-                "definition": "Price-to-Earnings ratio, a valuation metric comparing a company's current share price to its earnings per share.",
-                "category": "stock"
-            },
-            {
-                "term": "Market Cap",
-                "definition": "Market capitalization, total market value of a company's outstanding shares.",
-                "category": "stock"
-            },
-            {
-                "term": "Diversification",
-                "definition": "Strategy of spreading investments across various financial instruments to reduce risk.",
-                "category": "general"
-            },
-            {
-                "term": "Dividend",
-                "definition": "A portion of company profits paid to shareholders.",
-                "category": "stock"
-            },
-            {
-                "term": "Volatility",
-                "definition": "A statistical measure of the dispersion of returns for a given security or market index.",
-                "category": "general"
-            },
-            {
-                "term": "Beta",
-                "definition": "A measure of a stock's volatility in relation to the overall market.",
-                "category": "stock"
-            },
-            {
-                "term": "Bull Market",
-                "definition": "A market condition where prices are rising or expected to rise.",
-                "category": "general"
-            },
-            {
-                "term": "Bear Market",
-                "definition": "A market condition where prices are falling or expected to fall.",
-                "category": "general"
-            },
-            {
-                "term": "Portfolio",
-                "definition": "A collection of financial investments like stocks, bonds, commodities, etc.",
-                "category": "general"
-            },
-            {
-                "term": "ROI",
-                "definition": "Return on Investment, a measure of the profitability of an investment.",
-                "category": "general"
-            }
-        ]
-        
-        return {term["term"].lower(): FinancialTerm(**term) for term in terms_data}
-    
+    """
+    Glossary of financial terms, loaded from GLOSSARY_FILE on first use.
+
+    The file is checked for changes at most every reload_interval seconds and
+    reloaded when its modification time or size changes, so edits reach
+    every worker without a restart. A reload reads the file and builds all
+    of its indexes in a background thread while requests keep using the
+    current version, which is then swapped out in one step.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._glossary: Optional[Glossary] = None
+        self._version: Optional[Tuple[float, int]] = None
+        self._checked_at = 0.0
+        self._reloading: Optional[threading.Thread] = None
+
+    def _file_version(self) -> Optional[Tuple[float, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    @property
+    def glossary(self) -> Glossary:
+        now = time.monotonic()
+        if self._glossary is not None and now - self._checked_at < self.reload_interval:
+            return self._glossary
+        self._checked_at = now
+
+        version = self._file_version()
+        if self._glossary is None:
+            try:
+                self._glossary = load_glossary(self.path) if version else Glossary([], [], [])
+                self._version = version
+            except Exception as e:
+                print(f"Glossary load error for {self.path}: {str(e)}")
+                self._glossary = Glossary([], [], [])
+        elif version != self._version and (self._reloading is None or not self._reloading.is_alive()):
+            self._reloading = threading.Thread(target=self._reload, args=(version,), name="glossary-reload", daemon=True)
+            self._reloading.start()
+        return self._glossary
+
+    def _reload(self, version: Optional[Tuple[float, int]]):
+        try:
+            glossary = load_glossary(self.path) if version else Glossary([], [], [])
+            glossary.warm()
+        except Exception as e:
+            # Keep serving the current version; the next check tries again
+            print(f"Glossary load error for {self.path}: {str(e)}")
+            return
+        self._glossary, self._version = glossary, version
+
+    def __len__(self) -> int:
+        return len(self.glossary)
+
     def get_term(self, term: str) -> Optional[FinancialTerm]:
-        return self.terms.get(term.lower())
-    
+        glossary = self.glossary
+        term_id = glossary.lookup.get(term.lower())
+        return glossary.term(term_id) if term_id is not None else None
+
+    def detect_terms(self, text: str) -> List[FinancialTerm]:
+        """Terms mentioned in text as whole words, in order of appearance"""
+        glossary = self.glossary
+        return [glossary.term(term_id) for term_id in glossary.matcher.find(text)]
+
     def search_terms(self, query: str) -> List[FinancialTerm]:
-        """Search for terms that contain the query string"""
+        """
+        Search for terms that contain the query string.
+
+        Candidates come from the inverted index: each word of the query must
+        appear within some word of the term or its definition, found through a
+        trigram index over the vocabulary, so a query can start or end mid-word
+        ("vest" finds "investment"). Only those candidates get the substring check.
+        """
+        glossary = self.glossary
         query_lower = query.lower()
+        words = tokenize(query_lower)
+        if not words:
+            return []
+
+        candidates = glossary.substring_ids(words[-1])
+        for word in words[:-1]:
+            candidates = np.intersect1d(candidates, glossary.substring_ids(word), assume_unique=True)
+            if not len(candidates):
+                return []
+
         return [
-            term for term in self.terms.values()
-            if query_lower in term.term.lower() or query_lower in term.definition.lower()
+            glossary.term(term_id) for term_id in candidates.tolist()
+            if query_lower in glossary.names[term_id].lower() or query_lower in glossary.definitions[term_id].lower()
         ]
-    
+
     def get_category_terms(self, category: str) -> List[FinancialTerm]:
-        return [term for term in self.terms.values() if term.category == category]
+        glossary = self.glossary
+        if category not in glossary.category_labels:
+            return []
+        code = glossary.category_labels.index(category)
+        return [glossary.term(term_id) for term_id in glossary.category_ids(code).tolist()]
 
 # Global instance
-financial_kb = FinancialKnowledgeBase()
\ No newline at end of file
+financial_kb = FinancialKnowledgeBase(
+    path=os.getenv("GLOSSARY_FILE", "./data/financial_terms.jsonl"),
+    reload_interval=float(os.getenv("GLOSSARY_RELOAD_INTERVAL", "5"))
+)
@@ -1,31 +1,31 @@
+import asyncio
 import os
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 import google.generativeai as genai
 from .session_manager import session_manager
 from .financial_knowledge import financial_kb
+from .history_compactor import estimate_tokens, history_compactor
+from .answer_cache import answer_cache
 
 load_dotenv()
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-def finance_chatbot(query: str, session_id: str):
-    # Get recent conversation history
-    recent_messages = session_manager.get_session_history(session_id)
+# Use Google's Generative AI with Flash model for higher quotas; one client shared by all requests
+model = genai.GenerativeModel(os.getenv("CHATBOT_MODEL", "gemini-1.5-flash"))
+
+def build_prompt(query: str, session_id: str) -> Tuple[str, Dict[str, int]]:
+    """
+    Prompt for a query, with the session's history and any financial terms it mentions.
     
-    # Format conversation history
-    history_context = ""
-    if recent_messages:
-        history_context = "Recent conversation:\n"
-        for msg in recent_messages:
-            history_context += f"{msg.role.title()}: {msg.content}\n"
+    Also returns the prompt's estimated size, broken down by history and summary.
+    """
+    # Recent turns within the history token budget, older ones summarized
+    history_context, usage = history_compactor.compact(session_id)
     
     # Find relevant financial terms in the query
     detected_terms_context = ""
-    query_lower = query.lower()
-    found_terms = []
-    
-    for term_name, term_obj in financial_kb.terms.items():
-        if term_name.lower() in query_lower:
-            found_terms.append(f"{term_obj.term}: {term_obj.definition}")
+    found_terms = [f"{term_obj.term}: {term_obj.definition}" for term_obj in financial_kb.detect_terms(query)]
     
     if found_terms:
         detected_terms_context = "Detected financial terms:\n"
@@ -51,13 +51,110 @@ def finance_chatbot(query: str, session_id: str):
     5. Use tables to format financial data when appropriate
     6. Use emojis and formatting to make the response engaging
     """
+    return prompt, {"promptTokens": estimate_tokens(prompt), **usage}
+
+def _record_usage(usage: Dict[str, int], response):
+    """Add the model's own prompt token count when it reports one"""
+    try:
+        usage["modelPromptTokens"] = response.usage_metadata.prompt_token_count
+    except Exception:
+        pass
+
+def _cached_answer(query: str) -> Tuple[Optional[str], Optional[List[float]], Dict]:
+    """Answer from the cache if a similar query was answered before, with the query embedding for storing a miss"""
+    try:
+        answer, similarity, embedding = answer_cache.lookup(query)
+    except Exception as e:
+        # The cache only saves work, so a failed lookup (e.g. embedding quota) just means generating
+        print(f"Answer cache lookup error: {str(e)}")
+        return None, None, {"cache": "error"}
+    return answer, embedding, {"cache": "hit" if answer is not None else "miss", "similarity": round(similarity, 4)}
+
+def _store_answer(query: str, answer: str, embedding: Optional[List[float]]):
+    try:
+        answer_cache.store(query, answer, embedding)
+    except Exception as e:
+        print(f"Answer cache store error: {str(e)}")
+
+def _is_first_turn(session_id: str) -> bool:
+    # Answers that depend on earlier turns must not be cached or served from the cache
+    return not session_manager.get_session_history(session_id, 1)
+
+def _store_exchange(session_id: str, query: str, answer: str):
+    session_manager.add_message(session_id, "user", query)
+    session_manager.add_message(session_id, "assistant", answer)
+
+def finance_chatbot(query: str, session_id: str, use_cache: bool = True) -> Tuple[str, Dict]:
+    """
+    Answer query in the context of the session.
     
-    # Use Google's Generative AI with Flash model for higher quotas
-    model = genai.GenerativeModel('gemini-1.5-flash')
+    The first query of a session has no context, so it is answered from the
+    answer cache when a similar enough query was answered before, and its
+    generated answer is cached otherwise.
+    """
+    cacheable = use_cache and _is_first_turn(session_id)
+    embedding = None
+    cache_usage = {"cache": "skip"}
+    if cacheable:
+        answer, embedding, cache_usage = _cached_answer(query)
+        if answer is not None:
+            _store_exchange(session_id, query, answer)
+            return answer, cache_usage
+    
+    prompt, usage = build_prompt(query, session_id)
+    usage.update(cache_usage)
     response = model.generate_content(prompt)
+    _record_usage(usage, response)
     
     # Store the conversation
-    session_manager.add_message(session_id, "user", query)
-    session_manager.add_message(session_id, "assistant", response.text)
+    _store_exchange(session_id, query, response.text)
+    if cacheable and cache_usage["cache"] == "miss":
+        _store_answer(query, response.text, embedding)
+    
+    return response.text, usage
+
+async def finance_chatbot_stream(query: str, session_id: str, usage: Optional[Dict] = None, use_cache: bool = True):
+    """
+    Yield the answer in chunks as the model produces them.
     
-    return response.text
+    The exchange is added to the session only once the whole answer has arrived,
+    so an interrupted stream leaves no half answer in the history. The prompt
+    size is written into usage, if given. A cached first-turn answer comes as
+    a single chunk.
+    """
+    if usage is None:
+        usage = {}
+    # Session history and its compaction go through SQLite; keep them off the event loop
+    cacheable = use_cache and await asyncio.to_thread(_is_first_turn, session_id)
+    embedding = None
+    cache_usage = {"cache": "skip"}
+    if cacheable:
+        answer, embedding, cache_usage = await asyncio.to_thread(_cached_answer, query)
+        if answer is not None:
+            usage.update(cache_usage)
+            yield answer
+            await asyncio.to_thread(_store_exchange, session_id, query, answer)
+            return
+    
+    prompt, prompt_usage = await asyncio.to_thread(build_prompt, query, session_id)
+    usage.update(prompt_usage)
+    usage.update(cache_usage)
+    response = await model.generate_content_async(prompt, stream=True)
+    
+    chunks = []
+    async for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text, e.g. one carrying only a finish reason
+            continue
+        if text:
+            chunks.append(text)
+            yield text
+    _record_usage(usage, response)
+    
+    # Store the conversation
+    answer = "".join(chunks)
+    await asyncio.to_thread(_store_exchange, session_id, query, answer)
+    if cacheable and cache_usage["cache"] == "miss":
+        await asyncio.to_thread(_store_answer, query, answer, embedding)
@@ -0,0 +1,118 @@
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+import os
+import re
+from .session_manager import SessionManager, session_manager
+
+load_dotenv()
+
+# Rough size of a token in English text; close enough for budgeting without a tokenizer call
+CHARS_PER_TOKEN = 4
+
+EMOJI_PATTERN = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]")
+MARKUP_PATTERN = re.compile(r"[*_#`~]+|^\s*(?:>|[-+]|\d+\.)\s+", re.MULTILINE)
+SPACE_PATTERN = re.compile(r"\s+")
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def compact_text(text: str, max_tokens: int) -> str:
+    """
+    Plain-text gist of a message in at most about max_tokens tokens.
+
+    Table rows, emojis and markdown are dropped, since they cost tokens without
+    adding much context, and the rest is cut at a sentence boundary.
+    """
+    lines = [line for line in text.splitlines() if not line.lstrip().startswith('|')]
+    text = MARKUP_PATTERN.sub('', "\n".join(lines))
+    text = SPACE_PATTERN.sub(' ', EMOJI_PATTERN.sub('', text)).strip()
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(max_tokens, 1) * CHARS_PER_TOKEN]
+    boundary = cut.rfind('. ')
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + " ..."
+
+class HistoryCompactor:
+    """
+    Conversation history for a prompt, kept within a token budget.
+
+    The newest messages go in verbatim while they fit in the budget, and a
+    message too long for what is left goes in compacted. Everything older is
+    folded into a running summary of one compacted line per message, stored
+    with the session. The summary only grows by the messages that left the
+    recent window since the last prompt and drops its oldest lines beyond
+    summary_tokens, so no turn re-reads or re-summarizes the whole history.
+    """
+
+    def __init__(self, sessions: SessionManager, budget: int = 1200, summary_tokens: int = 300,
+                 line_tokens: int = 40, max_messages: int = 6, history_messages: int = 10):
+        self.sessions = sessions
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+        self.line_tokens = line_tokens
+        self.max_messages = max_messages
+        self.history_messages = history_messages
+
+    def _fold(self, summary: str, messages: List[Tuple[str, str]]) -> str:
+        lines = summary.splitlines() if summary else []
+        lines += [f"{role.title()}: {compact_text(content, self.line_tokens)}" for role, content in messages]
+        # Oldest lines go first once the summary is over its budget
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def compact(self, session_id: str) -> Tuple[str, Dict[str, int]]:
+        """History section of the prompt and its size"""
+        summary, until = self.sessions.get_summary(session_id) or ("", 0.0)
+        messages = [
+            (msg.role, msg.content, msg.timestamp.timestamp())
+            for msg in self.sessions.get_session_history(session_id, self.history_messages)
+        ]
+        # Messages up to until are already in the summary
+        messages = [msg for msg in messages if msg[2] > until]
+
+        # The summary's share is held back even before there is one, so folding never pushes past the budget
+        remaining = self.budget - self.summary_tokens
+        recent: List[str] = []
+        compacted = 0
+        start = len(messages)
+        while start > 0 and len(recent) < self.max_messages:
+            role, content, _ = messages[start - 1]
+            line = f"{role.title()}: {content}"
+            if estimate_tokens(line) > remaining:
+                line = f"{role.title()}: {compact_text(content, remaining - 4)}"
+                if remaining < 2 * self.line_tokens or estimate_tokens(line) > remaining:
+                    break
+                compacted += 1
+            recent.append(line)
+            remaining -= estimate_tokens(line)
+            start -= 1
+
+        older = messages[:start]
+        if older:
+            summary = self._fold(summary, [(role, content) for role, content, _ in older])
+            self.sessions.set_summary(session_id, summary, older[-1][2])
+
+        sections = []
+        if summary:
+            sections.append(f"Summary of earlier conversation:\n{summary}")
+        if recent:
+            sections.append("Recent conversation:\n" + "\n".join(reversed(recent)))
+        text = "\n\n".join(sections)
+        return text, {
+            "historyTokens": estimate_tokens(text),
+            "summaryTokens": estimate_tokens(summary),
+            "messagesIncluded": len(recent),
+            "messagesCompacted": compacted,
+            "messagesSummarized": len(older),
+        }
+
+history_compactor = HistoryCompactor(
+    session_manager,
+    budget=int(os.getenv("CHATBOT_HISTORY_TOKENS", "1200")),
+    summary_tokens=int(os.getenv("CHATBOT_SUMMARY_TOKENS", "300")),
+    max_messages=int(os.getenv("CHATBOT_HISTORY_MESSAGES", "6")),
+    history_messages=int(os.getenv("SESSION_MAX_MESSAGES", "10"))
+)
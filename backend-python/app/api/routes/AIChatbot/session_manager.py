@@ -1,39 +1,237 @@
-from typing import Dict, List, Optional
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel
 from datetime import datetime
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+import os
+import time
 import uuid
+from ...utils.sqlite_connections import ThreadLocalConnections
+
+load_dotenv()
 
 class Message(BaseModel):
     role: str  # "user" or "assistant"
     content: str
     timestamp: datetime
 
+# Stored form of a message: (role, content, unix timestamp)
+StoredMessage = Tuple[str, str, float]
+
+class SessionBackend(ABC):
+    """Where session histories live. Implementations keep at most max_messages per session."""
+
+    def __init__(self, max_messages: int):
+        self.max_messages = max_messages
+
+    @abstractmethod
+    def append(self, session_id: str, role: str, content: str, timestamp: float):
+        ...
+
+    @abstractmethod
+    def recent(self, session_id: str, num_messages: int) -> List[StoredMessage]:
+        """Last num_messages of a session, oldest first; marks the session as used"""
+
+    @abstractmethod
+    def get_summary(self, session_id: str) -> Optional[Tuple[str, float]]:
+        """Summary of a session's older messages and the timestamp of the last message it covers"""
+
+    @abstractmethod
+    def set_summary(self, session_id: str, summary: str, until: float):
+        ...
+
+    @abstractmethod
+    def evict(self, idle_before: float, max_sessions: int) -> int:
+        """Drop sessions idle since before idle_before, then the least recently used beyond max_sessions"""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+class MemoryBackend(SessionBackend):
+    """Sessions in this process only, in least-recently-used order"""
+
+    def __init__(self, max_messages: int):
+        super().__init__(max_messages)
+        self.sessions: "OrderedDict[str, deque]" = OrderedDict()
+        self.last_access: Dict[str, float] = {}
+        self.summaries: Dict[str, Tuple[str, float]] = {}
+
+    def _touch(self, session_id: str):
+        self.sessions.move_to_end(session_id)
+        self.last_access[session_id] = time.time()
+
+    def append(self, session_id: str, role: str, content: str, timestamp: float):
+        if session_id not in self.sessions:
+            self.sessions[session_id] = deque(maxlen=self.max_messages)
+        self.sessions[session_id].append((role, content, timestamp))
+        self._touch(session_id)
+
+    def recent(self, session_id: str, num_messages: int) -> List[StoredMessage]:
+        if session_id not in self.sessions:
+            return []
+        self._touch(session_id)
+        messages = self.sessions[session_id]
+        return list(messages)[-num_messages:]
+
+    def get_summary(self, session_id: str) -> Optional[Tuple[str, float]]:
+        return self.summaries.get(session_id)
+
+    def set_summary(self, session_id: str, summary: str, until: float):
+        if session_id in self.sessions:
+            self.summaries[session_id] = (summary, until)
+
+    def evict(self, idle_before: float, max_sessions: int) -> int:
+        evicted = 0
+        # Oldest first, so stop at the first session still in use
+        while self.sessions:
+            session_id = next(iter(self.sessions))
+            if self.last_access[session_id] >= idle_before and len(self.sessions) <= max_sessions:
+                break
+            del self.sessions[session_id]
+            del self.last_access[session_id]
+            self.summaries.pop(session_id, None)
+            evicted += 1
+        return evicted
+
+    def count(self) -> int:
+        return len(self.sessions)
+
+class SQLiteBackend(SessionBackend):
+    """
+    Sessions in a SQLite database in WAL mode, shared by every worker on the host.
+
+    Messages are keyed by (session_id, id), so appending and reading the
+    newest messages of a session are single index operations.
+    """
+
+    def __init__(self, path: str, max_messages: int):
+        super().__init__(max_messages)
+        self.path = path
+        # Durable enough with WAL and skips an fsync per message
+        self._db = ThreadLocalConnections(
+            path,
+            "CREATE TABLE IF NOT EXISTS chat_sessions (session_id TEXT PRIMARY KEY, last_access REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS chat_sessions_last_access ON chat_sessions (last_access);"
+            "CREATE TABLE IF NOT EXISTS chat_messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+            "role TEXT NOT NULL, content TEXT NOT NULL, timestamp REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS chat_messages_session ON chat_messages (session_id, id);"
+            "CREATE TABLE IF NOT EXISTS chat_summaries (session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, until REAL NOT NULL);",
+            synchronous="NORMAL",
+        )
+
+    def _transaction(self, statements: List[Tuple[str, tuple]]) -> list:
+        """Run statements in one transaction and return the rows of the last one"""
+        with self._db.connect() as conn:
+            rows = []
+            for sql, params in statements:
+                rows = conn.execute(sql, params).fetchall()
+            return rows
+
+    def _touch(self, session_id: str) -> Tuple[str, tuple]:
+        return (
+            "INSERT INTO chat_sessions (session_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+            (session_id, time.time())
+        )
+
+    def append(self, session_id: str, role: str, content: str, timestamp: float):
+        self._transaction([
+            self._touch(session_id),
+            ("INSERT INTO chat_messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+             (session_id, role, content, timestamp)),
+            # Drop everything older than the newest max_messages
+            ("DELETE FROM chat_messages WHERE session_id = ? AND id <= "
+             "(SELECT id FROM chat_messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+             (session_id, session_id, self.max_messages)),
+        ])
+
+    def recent(self, session_id: str, num_messages: int) -> List[StoredMessage]:
+        rows = self._transaction([
+            ("UPDATE chat_sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id)),
+            ("SELECT role, content, timestamp FROM chat_messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+             (session_id, num_messages)),
+        ])
+        return [tuple(row) for row in reversed(rows)]
+
+    def get_summary(self, session_id: str) -> Optional[Tuple[str, float]]:
+        rows = self._transaction([("SELECT summary, until FROM chat_summaries WHERE session_id = ?", (session_id,))])
+        return tuple(rows[0]) if rows else None
+
+    def set_summary(self, session_id: str, summary: str, until: float):
+        self._transaction([(
+            "INSERT OR REPLACE INTO chat_summaries (session_id, summary, until) VALUES (?, ?, ?)",
+            (session_id, summary, until)
+        )])
+
+    def evict(self, idle_before: float, max_sessions: int) -> int:
+        stale = (
+            "SELECT session_id FROM chat_sessions WHERE last_access < ? UNION "
+            "SELECT session_id FROM (SELECT session_id FROM chat_sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)"
+        )
+        rows = self._transaction([
+            (f"DELETE FROM chat_messages WHERE session_id IN ({stale})", (idle_before, max_sessions)),
+            (f"DELETE FROM chat_summaries WHERE session_id IN ({stale})", (idle_before, max_sessions)),
+            (f"DELETE FROM chat_sessions WHERE session_id IN ({stale}) RETURNING session_id", (idle_before, max_sessions)),
+        ])
+        return len(rows)
+
+    def count(self) -> int:
+        return self._transaction([("SELECT COUNT(*) FROM chat_sessions", ())])[0][0]
+
 class SessionManager:
-    def __init__(self):
-        self.sessions: Dict[str, List[Message]] = {}
-    
+    """
+    Chat histories with idle expiry and a cap on the number of sessions.
+
+    Sessions only take space once a message is added, so handing out ids is
+    free. Expired and least recently used sessions are swept at most once per
+    sweep_interval.
+    """
+
+    def __init__(self, backend: SessionBackend, idle_ttl: float = 3600.0, max_sessions: int = 10000, sweep_interval: float = 60.0):
+        self.backend = backend
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self._swept_at = 0.0
+
     def create_session(self) -> str:
-        session_id = str(uuid.uuid4())
-        self.sessions[session_id] = []
-        return session_id
-    
+        return str(uuid.uuid4())
+
+    def _sweep(self):
+        now = time.time()
+        if now - self._swept_at >= self.sweep_interval:
+            self._swept_at = now
+            self.backend.evict(now - self.idle_ttl, self.max_sessions)
+
     def add_message(self, session_id: str, role: str, content: str):
-        if session_id not in self.sessions:
-            self.sessions[session_id] = []
-        
-        self.sessions[session_id].append(Message(
-            role=role,
-            content=content,
-            timestamp=datetime.now()
-        ))
-        
-        # Keep only last 10 messages to prevent memory issues
-        if len(self.sessions[session_id]) > 10:
-            self.sessions[session_id] = self.sessions[session_id][-10:]
-    
+        self.backend.append(session_id, role, content, time.time())
+        self._sweep()
+
+    def get_summary(self, session_id: str) -> Optional[Tuple[str, float]]:
+        return self.backend.get_summary(session_id)
+
+    def set_summary(self, session_id: str, summary: str, until: float):
+        self.backend.set_summary(session_id, summary, until)
+
     def get_session_history(self, session_id: str, num_messages: int = 6) -> List[Message]:
-        if session_id not in self.sessions:
-            return []
-        return self.sessions[session_id][-num_messages:]
+        return [
+            Message(role=role, content=content, timestamp=datetime.fromtimestamp(timestamp))
+            for role, content, timestamp in self.backend.recent(session_id, num_messages)
+        ]
+
+def _create_backend() -> SessionBackend:
+    # Keep only last 10 messages to prevent memory issues
+    max_messages = int(os.getenv("SESSION_MAX_MESSAGES", "10"))
+    if os.getenv("SESSION_BACKEND", "sqlite") == "memory":
+        return MemoryBackend(max_messages)
+    return SQLiteBackend(os.getenv("SESSION_DB", "./db/sessions.sqlite3"), max_messages)
 
-session_manager = SessionManager()
\ No newline at end of file
+session_manager = SessionManager(
+    backend=_create_backend(),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "3600")),
+    max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")),
+    sweep_interval=float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+)
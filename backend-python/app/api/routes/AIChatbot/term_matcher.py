@@ -0,0 +1,89 @@
+import re
+from typing import Dict, Iterable, List
+
+# Words, keeping inner punctuation that belongs to financial terms: p/e, s&p, year-over-year, 10.5
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[/&.'\-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TermMatcher:
+    """
+    Aho-Corasick automaton over word tokens.
+
+    Patterns and text are split into words first, so a pattern only matches
+    whole words ("beta" does not fire inside "alphabet") and the automaton has
+    one state per distinct word prefix instead of one per character. Finding
+    every pattern in a text costs one pass over its words, however many
+    patterns there are.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._vocabulary: Dict[str, int] = {}
+        self._goto: Dict[int, int] = {}
+        self._fail: List[int] = [0]
+        self._terminal: List[int] = [-1]
+        # Nearest state down the fail chain that ends a pattern, or 0
+        self._output: List[int] = [0]
+
+        children: List[List[int]] = [[]]
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for token in tokenize(pattern):
+                key = self._key(state, self._vocabulary.setdefault(token, len(self._vocabulary)))
+                child = self._goto.get(key)
+                if child is None:
+                    child = len(self._fail)
+                    self._goto[key] = child
+                    self._fail.append(0)
+                    self._terminal.append(-1)
+                    self._output.append(0)
+                    children.append([])
+                    children[state].append(key)
+                state = child
+            if state and self._terminal[state] < 0:
+                self._terminal[state] = pattern_id
+
+        self._build_links(children)
+
+    @staticmethod
+    def _key(state: int, token_id: int) -> int:
+        return (state << 24) | token_id
+
+    def _step(self, state: int, token_id: int) -> int:
+        while True:
+            child = self._goto.get(self._key(state, token_id))
+            if child is not None:
+                return child
+            if state == 0:
+                return 0
+            state = self._fail[state]
+
+    def _build_links(self, children: List[List[int]]):
+        queue = [self._goto[key] for key in children[0]]
+        for state in queue:
+            for key in children[state]:
+                child = self._goto[key]
+                token_id = key & 0xFFFFFF
+                fail = self._step(self._fail[state], token_id)
+                self._fail[child] = fail
+                self._output[child] = fail if self._terminal[fail] >= 0 else self._output[fail]
+                queue.append(child)
+
+    def find(self, text: str) -> List[int]:
+        """Ids of the patterns found in text, in order of first appearance"""
+        found: Dict[int, None] = {}
+        state = 0
+        for token in tokenize(text):
+            token_id = self._vocabulary.get(token)
+            if token_id is None:
+                state = 0
+                continue
+            state = self._step(state, token_id)
+            match = state if self._terminal[state] >= 0 else self._output[state]
+            while match:
+                found.setdefault(self._terminal[match])
+                match = self._output[match]
+        return list(found)
@@ -1,5 +1,6 @@
 import asyncio
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List
 from pydantic import BaseModel, Field
 from rich.pretty import pprint
@@ -15,12 +16,16 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 model = Groq(id="llama-3.3-70b-versatile", api_key=GROQ_API_KEY)
 
+# Analyses run on a fixed pool of threads, which caps how many Groq calls are in flight at once
+SENTIMENT_CONCURRENCY = int(os.getenv("SENTIMENT_CONCURRENCY", "4"))
+_executor = ThreadPoolExecutor(max_workers=SENTIMENT_CONCURRENCY, thread_name_prefix="sentiment")
+
 class SentimentAnalysisResult(BaseModel):
     sentiment: str = Field(..., description="Sentiment classification: Bullish, Bearish, or Neutral.")
     reason: str = Field(..., description="Explanation for the sentiment classification.")
 
-def get_sentiment_agent(url: str) -> SentimentAnalysisResult:
-    sentiment_agent = Agent(
+def _create_agent() -> Agent:
+    return Agent(
         tools=[],
         description=(
             "You are a Sentiment Analyzer. You will be given a URL to a news article. "
@@ -38,6 +43,18 @@ def get_sentiment_agent(url: str) -> SentimentAnalysisResult:
         show_tool_calls=True
     )
 
+def get_sentiment_agent(url: str) -> SentimentAnalysisResult:
+    # A fresh agent per article so no run history carries over; the model client above is shared
+    sentiment_agent = _create_agent()
+
     result = sentiment_agent.run(f"{url}")
     return result.content
 
+def submit_sentiment(url: str) -> Future:
+    """Queue get_sentiment_agent on the analysis pool; the future is done once its thread is"""
+    return _executor.submit(get_sentiment_agent, url)
+
+async def analyze_sentiment(url: str) -> SentimentAnalysisResult:
+    """Run get_sentiment_agent on the analysis pool, keeping the event loop free while it waits"""
+    return await asyncio.wrap_future(submit_sentiment(url))
+
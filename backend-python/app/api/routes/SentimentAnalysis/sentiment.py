@@ -1,19 +1,108 @@
-from fastapi import APIRouter, Cookie, File, UploadFile, HTTPException,Request
-from .helper import get_sentiment_agent
+from fastapi import APIRouter, Cookie, File, UploadFile, HTTPException,Request, Response
+from .helper import SENTIMENT_CONCURRENCY, analyze_sentiment, submit_sentiment
+from .sentiment_cache import sentiment_cache
 from app.api.middlewares import authUser
-from typing import List
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+import asyncio
+import json
 import os
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 router = APIRouter()
 
+SENTIMENT_BATCH_MAX_URLS = int(os.getenv("SENTIMENT_BATCH_MAX_URLS", "100"))
+# Batches get fewer analysis threads than the pool has, so single-article requests never queue behind them
+SENTIMENT_BATCH_CONCURRENCY = max(1, min(int(os.getenv("SENTIMENT_BATCH_CONCURRENCY", "2")), SENTIMENT_CONCURRENCY - 1))
+_batch_slots = asyncio.Semaphore(SENTIMENT_BATCH_CONCURRENCY)
+
+
+class SentimentBatchRequest(BaseModel):
+    urls: List[str]
+
+
+def _plain(result: Any) -> Any:
+    # Unstructured output is passed through as before, but only dicts get cached
+    return result.model_dump() if isinstance(result, BaseModel) else result
+
+
+async def _analyze(url: str) -> Any:
+    return _plain(await analyze_sentiment(url))
+
+
+async def _analyze_for_batch(url: str) -> Any:
+    await _batch_slots.acquire()
+    loop = asyncio.get_running_loop()
+    try:
+        future = submit_sentiment(url)
+    except BaseException:
+        _batch_slots.release()
+        raise
+    # A cancelled request stops waiting, but its analysis thread may still be running; free the slot when that ends
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(_batch_slots.release))
+    return _plain(await asyncio.wrap_future(future))
+
 
 @router.get("/sentiment")
-async def sentiment(url: str):
+async def sentiment(url: str, response: Response, content_hash: Optional[str] = None, refresh: bool = False):
+    """
+    Sentiment of a news article, cached per normalized URL.
+
+    Pass content_hash to have a result stored for different content analyzed
+    again, or refresh=true to analyze regardless. Whether the result came from
+    the cache is reported in the X-Sentiment-Cache header.
+    """
     try:
-        result = get_sentiment_agent(url)
+        if refresh:
+            await asyncio.to_thread(sentiment_cache.invalidate, url)
+        result, cache = await sentiment_cache.get(url, lambda: _analyze(url), content_hash)
+        response.headers["X-Sentiment-Cache"] = cache["status"]
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/sentiment/batch")
+async def sentiment_batch(request: SentimentBatchRequest):
+    """
+    Sentiment of many articles, sent as Server-Sent Events in the order they finish.
+
+    Each URL gets a "result" event with its sentiment and cache status, or
+    with an error if its analysis failed; a "done" event with the counts ends
+    the stream. Uncached articles from all batches are analyzed at most
+    SENTIMENT_BATCH_CONCURRENCY at a time, which leaves analysis threads free
+    for the single-article endpoint.
+    """
+    urls = list(dict.fromkeys(url.strip() for url in request.urls if url.strip()))
+    if not urls:
+        raise HTTPException(status_code=400, detail="No URLs provided")
+    if len(urls) > SENTIMENT_BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {SENTIMENT_BATCH_MAX_URLS} URLs per request")
+
+    async def analyze_one(url: str) -> Dict[str, Any]:
+        try:
+            result, cache = await sentiment_cache.get(url, lambda: _analyze_for_batch(url))
+            fields = result if isinstance(result, dict) else {"result": result}
+            return {"url": url, **fields, "cache": cache["status"]}
+        except Exception as e:
+            return {"url": url, "error": str(e)}
+
+    async def events():
+        tasks = [asyncio.create_task(analyze_one(url)) for url in urls]
+        failed = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                item = await finished
+                failed += "error" in item
+                yield f"event: result\ndata: {json.dumps(item)}\n\n"
+            yield f"event: done\ndata: {json.dumps({'total': len(urls), 'failed': failed})}\n\n"
+        finally:
+            # Client went away: stop waiting on analyses nobody will read
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
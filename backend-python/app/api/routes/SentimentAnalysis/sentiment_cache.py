@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from dotenv import load_dotenv
+
+from ...utils.single_flight import SingleFlight
+from ...utils.sqlite_connections import ThreadLocalConnections
+
+load_dotenv()
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = frozenset(('fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref', 'cmpid', 'ocid'))
+
+
+def normalize_url(url: str) -> str:
+    """
+    Cache key form of an article URL.
+
+    Scheme and host are lowercased, "www.", default ports, fragments, trailing
+    slashes and tracking parameters are dropped, and the remaining query
+    parameters are sorted, so links shared from different places map to the
+    same article.
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or 'https').lower()
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not (key.lower().startswith('utm_') or key.lower() in TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path.rstrip('/') or '/', urlencode(query), ''))
+
+
+class SentimentCache:
+    """
+    Sentiment results per article, kept in SQLite so every worker shares them.
+
+    Entries are keyed by normalized URL and served for ttl seconds. A caller
+    that knows the article's content hash can pass it, and an entry stored
+    for different content is then analyzed again. Concurrent misses for the
+    same URL and content hash in this process share a single analysis;
+    failed analyses, and results that are not dicts, are not stored.
+
+    peek, put and invalidate block on SQLite, so get runs them in a thread;
+    each thread keeps its own connection.
+    """
+
+    def __init__(self, path: str, ttl: float = 21600.0):
+        self.path = path
+        self.ttl = ttl
+        self._db = ThreadLocalConnections(
+            path,
+            "CREATE TABLE IF NOT EXISTS sentiment_results ("
+            "url TEXT PRIMARY KEY, content_hash TEXT, result TEXT NOT NULL, analyzed_at REAL NOT NULL)"
+        )
+        self._inflight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._db.connect() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def peek(self, url: str, content_hash: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (result, age) for a fresh entry matching content_hash (if given), or None"""
+        rows = self._execute(
+            "SELECT content_hash, result, analyzed_at FROM sentiment_results WHERE url = ?", (normalize_url(url),)
+        )
+        if not rows:
+            return None
+        stored_hash, result, analyzed_at = rows[0]
+        age = time.time() - analyzed_at
+        if age > self.ttl or (content_hash is not None and content_hash != stored_hash):
+            return None
+        return json.loads(result), age
+
+    def put(self, url: str, result: Dict[str, Any], content_hash: Optional[str] = None):
+        self._execute(
+            "INSERT OR REPLACE INTO sentiment_results (url, content_hash, result, analyzed_at) VALUES (?, ?, ?, ?)",
+            (normalize_url(url), content_hash, json.dumps(result), time.time())
+        )
+
+    def invalidate(self, url: str):
+        self._execute("DELETE FROM sentiment_results WHERE url = ?", (normalize_url(url),))
+
+    async def get(
+        self, url: str, analyze: Callable[[], Awaitable[Any]], content_hash: Optional[str] = None
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Return the result for url, calling analyze on a miss.
+
+        The second element describes how it was served: "hit" with the entry
+        age in seconds, "miss" when this call analyzed the article, or
+        "coalesced" when it waited on another caller's analysis.
+        """
+        cached = await asyncio.to_thread(self.peek, url, content_hash)
+        if cached is not None:
+            self.hits += 1
+            result, age = cached
+            return result, {"status": "hit", "age": round(age, 1)}
+
+        key = (normalize_url(url), content_hash)
+        if key in self._inflight:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        result, shared = await self._inflight.do(key, analyze)
+        if shared:
+            return result, {"status": "coalesced", "age": 0.0}
+
+        # Waiting callers already have the result; storing it is best effort
+        if isinstance(result, dict):
+            try:
+                await asyncio.to_thread(self.put, url, result, content_hash)
+            except Exception as e:
+                print(f"Sentiment cache store error: {str(e)}")
+        return result, {"status": "miss", "age": 0.0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "ttl": self.ttl,
+        }
+
+
+sentiment_cache = SentimentCache(
+    path=os.getenv("SENTIMENT_CACHE_DB", "./db/sentiment.sqlite3"),
+    ttl=float(os.getenv("SENTIMENT_CACHE_TTL", "21600")),
+)
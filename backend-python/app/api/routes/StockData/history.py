@@ -0,0 +1,139 @@
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'}
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+
+
+def normalize_history(hist: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce a yfinance history frame to lowercase OHLCV columns on a DatetimeIndex.
+
+    Works for both daily ("Date") and intraday ("Datetime") frames. Rows without
+    a close are dropped and missing volume is treated as zero.
+    """
+    frame = hist.rename(columns=OHLCV_COLUMNS)[list(OHLCV_COLUMNS.values())]
+    frame = frame[frame['close'].notna()].assign(volume=lambda f: f['volume'].fillna(0))
+    frame.index.name = 'date'
+    return frame
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Row indices chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. Each bucket in between keeps the
+    point forming the largest triangle with the previously kept point and the
+    mean of the next bucket. Buckets are walked in order because each choice
+    depends on the previous one, but the work inside a bucket is vectorized,
+    so the Python loop runs max_points times regardless of the input length.
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def downsample_lttb(frame: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """Keep the max_points rows that best preserve the shape of the close series"""
+    x = epoch_seconds(frame.index).astype(float)
+    return frame.iloc[lttb_indices(x, frame['close'].to_numpy(dtype=float), max_points)]
+
+
+def aggregate_buckets(frame: pd.DataFrame, starts: np.ndarray, index: Optional[pd.Index] = None) -> pd.DataFrame:
+    """
+    Merge runs of consecutive rows into bars; starts holds the first row of each run.
+
+    Each bar keeps the first open, highest high, lowest low, last close and
+    total volume. It is stamped with its first row unless index is given.
+    """
+    ends = np.append(starts[1:], len(frame)) - 1
+    return pd.DataFrame({
+        'open': frame['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(frame['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(frame['low'].to_numpy(), starts),
+        'close': frame['close'].to_numpy()[ends],
+        'volume': np.add.reduceat(frame['volume'].to_numpy(), starts),
+    }, index=frame.index[starts] if index is None else index)
+
+
+def downsample_ohlc(frame: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """Merge consecutive rows into max_points equal-count candles"""
+    n = len(frame)
+    if max_points >= n:
+        return frame
+
+    return aggregate_buckets(frame, np.linspace(0, n, max_points, endpoint=False).astype(np.int64))
+
+
+DOWNSAMPLERS = {'lttb': downsample_lttb, 'ohlc': downsample_ohlc}
+
+
+def _offset_label(seconds: int) -> str:
+    sign = '-' if seconds < 0 else '+'
+    hours, minutes = divmod(abs(int(seconds)) // 60, 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
+
+
+def _iso_dates(index: pd.DatetimeIndex) -> np.ndarray:
+    """Vectorized equivalent of calling isoformat() on every timestamp"""
+    wall = index.tz_localize(None) if index.tz is not None else index
+    dates = np.datetime_as_string(wall.to_numpy().astype('datetime64[s]'), unit='s')
+    if index.tz is None:
+        return dates
+
+    # Only a handful of distinct UTC offsets (DST changes) occur in a series
+    offsets = wall.as_unit('s').asi8 - index.as_unit('s').asi8
+    unique, inverse = np.unique(offsets, return_inverse=True)
+    labels = np.array([_offset_label(offset) for offset in unique])
+    return np.char.add(dates, labels[inverse])
+
+
+def epoch_seconds(index: pd.DatetimeIndex) -> np.ndarray:
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    return index.as_unit('s').asi8
+
+
+def serialize_history(frame: pd.DataFrame, fmt: str = 'records') -> Any:
+    """
+    Serialize a normalized OHLCV frame column by column.
+
+    "records" returns a list of {date, open, high, low, close, volume} dicts.
+    "columnar" returns parallel arrays keyed by timestamps (epoch seconds, UTC)
+    and each OHLCV field, which charting clients can consume directly.
+    """
+    prices = {column: np.round(frame[column].to_numpy(dtype=float), 2) for column in PRICE_COLUMNS}
+    volume = frame['volume'].to_numpy(dtype=float).astype(np.int64)
+
+    if fmt == 'columnar':
+        return {
+            "timestamps": epoch_seconds(frame.index).tolist(),
+            **{column: values.tolist() for column, values in prices.items()},
+            "volume": volume.tolist()
+        }
+
+    columns = [_iso_dates(frame.index).tolist()]
+    columns += [prices[column].tolist() for column in PRICE_COLUMNS]
+    columns.append(volume.tolist())
+    keys = ('date',) + PRICE_COLUMNS + ('volume',)
+    return [dict(zip(keys, row)) for row in zip(*columns)]
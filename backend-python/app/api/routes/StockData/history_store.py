@@ -0,0 +1,353 @@
+import asyncio
+import contextlib
+import json
+import os
+import tempfile
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from dotenv import load_dotenv
+
+from .history import normalize_history
+from .market_data import run_upstream
+from .quote_cache import QuoteCache
+from .resample import INTRADAY_SECONDS, can_derive, resample_bars
+
+load_dotenv()
+
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('volume', '<f8')
+])
+
+# Past bars only stay fixed for these intervals; intraday ranges are short and go straight upstream
+STORED_INTERVALS = ('1d', '5d', '1wk', '1mo', '3mo')
+PERIOD_OFFSETS = {
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10),
+}
+STORED_PERIODS = set(PERIOD_OFFSETS) | {'ytd', 'max'}
+
+# Relative close difference on the overlapping bar that means past prices were re-adjusted
+ADJUSTMENT_TOLERANCE = 1e-4
+# Upstream deadline for one multi-symbol download
+HISTORY_BATCH_TIMEOUT = float(os.getenv("HISTORY_BATCH_TIMEOUT", "60"))
+
+
+def _fetch_history(symbol: str, **kwargs) -> pd.DataFrame:
+    return yf.Ticker(symbol).history(**kwargs)
+
+
+def _download_history(symbols: List[str], **kwargs) -> Dict[str, pd.DataFrame]:
+    """Fetch history for many symbols in one request and split it per symbol"""
+    # Keep exchange timezones so bars line up with what Ticker.history stores
+    data = yf.download(tickers=symbols, group_by='ticker', auto_adjust=True, ignore_tz=False, progress=False, **kwargs)
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    for symbol in symbols:
+        if hasattr(data.columns, 'levels') and symbol in data.columns.levels[0]:
+            hist = data[symbol]
+        elif len(symbols) == 1 and 'Close' in data.columns:
+            hist = data
+        else:
+            continue
+        frame = normalize_history(hist)
+        if not frame.empty:
+            frames[symbol] = frame
+    return frames
+
+
+def frame_to_bars(frame: pd.DataFrame) -> np.ndarray:
+    """Pack a normalized OHLCV frame into a structured array keyed by UTC epoch seconds"""
+    index = frame.index if frame.index.tz is not None else frame.index.tz_localize('UTC')
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    bars['ts'] = index.as_unit('s').asi8
+    for column in ('open', 'high', 'low', 'close', 'volume'):
+        bars[column] = frame[column].to_numpy(dtype=float)
+    return bars
+
+
+def bars_to_frame(bars: np.ndarray, tz: Optional[str]) -> pd.DataFrame:
+    index = pd.to_datetime(bars['ts'], unit='s', utc=True)
+    if tz:
+        index = index.tz_convert(tz)
+    frame = pd.DataFrame({column: bars[column] for column in ('open', 'high', 'low', 'close', 'volume')}, index=index)
+    frame.index.name = 'date'
+    return frame
+
+
+class HistoryStore:
+    """
+    On-disk OHLCV store keyed by (symbol, interval).
+
+    Bars live in one .npy structured array per key, read memory-mapped, with a
+    JSON sidecar recording the timezone, how far back the data reaches and when
+    the tail was last refreshed. Files are replaced atomically, so readers in
+    other uvicorn workers always see a complete file. Only bars after the last
+    stored one are fetched from upstream once the tail goes stale.
+    """
+
+    def __init__(self, root: str, tail_ttl: float = 300.0):
+        self.root = root
+        self.tail_ttl = tail_ttl
+        # Entries go away once no request holds or waits on the lock
+        self._locks: "weakref.WeakValueDictionary[Tuple[str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _lock(self, symbol: str, interval: str) -> asyncio.Lock:
+        key = (symbol.upper(), interval)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def supports(self, period: str, interval: str) -> bool:
+        return period in STORED_PERIODS and interval in STORED_INTERVALS
+
+    def _path(self, symbol: str, interval: str, suffix: str) -> str:
+        return os.path.join(self.root, f"{quote(symbol.upper(), safe='')}_{interval}{suffix}")
+
+    def read(self, symbol: str, interval: str) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+        try:
+            with open(self._path(symbol, interval, '.json')) as f:
+                meta = json.load(f)
+            bars = np.load(self._path(symbol, interval, '.npy'), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        return bars, meta
+
+    def _replace(self, path: str, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def write(self, symbol: str, interval: str, bars: np.ndarray, meta: Dict[str, Any]):
+        os.makedirs(self.root, exist_ok=True)
+        # Bars first: a reader pairing new bars with the old sidecar only sees an older fetched_at
+        self._replace(self._path(symbol, interval, '.npy'), lambda f: np.save(f, bars))
+        self._replace(self._path(symbol, interval, '.json'), lambda f: f.write(json.dumps(meta).encode()))
+
+    @staticmethod
+    def period_start(period: str) -> Optional[int]:
+        """Epoch seconds where a period begins, or None for 'max'"""
+        now = pd.Timestamp.now(tz='UTC')
+        if period == 'max':
+            return None
+        if period == 'ytd':
+            return int(pd.Timestamp(year=now.year, month=1, day=1, tz='UTC').timestamp())
+        return int((now - PERIOD_OFFSETS[period]).timestamp())
+
+    def holds(self, symbol: str, period: str, interval: str) -> bool:
+        """Whether the store already has bars reaching back to the start of period"""
+        stored = self.read(symbol, interval)
+        return (
+            period in STORED_PERIODS and stored is not None and len(stored[0]) > 0
+            and self._covers(stored[1], self.period_start(period))
+        )
+
+    @staticmethod
+    def _covers(meta: Dict[str, Any], start: Optional[int]) -> bool:
+        if meta.get('complete'):
+            return True
+        return start is not None and start >= meta['coverage_start']
+
+    async def _fetch(self, symbol: str, **kwargs) -> pd.DataFrame:
+        hist = await run_upstream(_fetch_history, symbol, **kwargs)
+        return normalize_history(hist) if not hist.empty else pd.DataFrame()
+
+    def _local_date(self, ts: int, meta: Dict[str, Any]) -> str:
+        stamp = pd.Timestamp(int(ts), unit='s', tz='UTC')
+        if meta.get('tz'):
+            stamp = stamp.tz_convert(meta['tz'])
+        return stamp.strftime('%Y-%m-%d')
+
+    async def _refresh_full(self, symbol: str, interval: str, start: Optional[int], **fetch_kwargs) -> Tuple[np.ndarray, Dict[str, Any]]:
+        frame = await self._fetch(symbol, interval=interval, **fetch_kwargs)
+        return await self._store_full(symbol, interval, start, frame)
+
+    async def _store_full(self, symbol: str, interval: str, start: Optional[int], frame: pd.DataFrame) -> Tuple[np.ndarray, Dict[str, Any]]:
+        if frame.empty:
+            return np.empty(0, dtype=BAR_DTYPE), {}
+
+        meta = {
+            'tz': str(frame.index.tz) if frame.index.tz is not None else None,
+            'complete': start is None,
+            'coverage_start': start if start is not None else 0,
+            'fetched_at': time.time(),
+        }
+        bars = frame_to_bars(frame)
+        # Saving and renaming files blocks; keep it off the event loop
+        await asyncio.to_thread(self.write, symbol, interval, bars, meta)
+        return bars, meta
+
+    async def _refresh_tail(self, symbol: str, interval: str, bars: np.ndarray, meta: Dict[str, Any]) -> Tuple[np.ndarray, Dict[str, Any], str]:
+        # Start one bar back: the last stored bar may still have been forming, and the
+        # one before it is a settled bar to compare against
+        anchor = int(bars['ts'][max(len(bars) - 2, 0)])
+        tail = await self._fetch(symbol, start=self._local_date(anchor, meta), interval=interval)
+        return await self._apply_tail(symbol, interval, bars, meta, tail)
+
+    async def _apply_tail(self, symbol: str, interval: str, bars: np.ndarray, meta: Dict[str, Any], tail: pd.DataFrame) -> Tuple[np.ndarray, Dict[str, Any], str]:
+        """Merge freshly fetched recent bars into the stored ones, refetching everything after a re-adjustment"""
+        meta = {**meta, 'fetched_at': time.time()}
+        if tail.empty:
+            await asyncio.to_thread(self.write, symbol, interval, np.asarray(bars), meta)
+            return bars, meta, 'tail'
+
+        tail_bars = frame_to_bars(tail)
+        overlap = int(np.searchsorted(bars['ts'], tail_bars['ts'][0]))
+        if overlap < len(bars) and bars['ts'][overlap] == tail_bars['ts'][0]:
+            stored_close = bars['close'][overlap]
+            if abs(stored_close - tail_bars['close'][0]) > ADJUSTMENT_TOLERANCE * abs(stored_close):
+                # A split or dividend re-adjusted past prices, so the stored series is stale
+                if meta.get('complete'):
+                    bars, meta = await self._refresh_full(symbol, interval, None, period='max')
+                else:
+                    start = meta['coverage_start']
+                    bars, meta = await self._refresh_full(symbol, interval, start, start=self._local_date(start, meta))
+                return bars, meta, 'full'
+
+        merged = np.concatenate([bars[:overlap], tail_bars])
+        await asyncio.to_thread(self.write, symbol, interval, merged, meta)
+        return merged, meta, 'tail'
+
+    async def history(self, symbol: str, period: str, interval: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        Return the normalized OHLCV frame for a period plus a description of how
+        it was served: "hit" (disk only), "tail" (disk plus new bars) or "full"
+        (downloaded because the store did not reach back far enough).
+        """
+        start = self.period_start(period)
+
+        async with self._lock(symbol, interval):
+            stored = self.read(symbol, interval)
+            if stored is None or len(stored[0]) == 0 or not self._covers(stored[1], start):
+                bars, meta = await self._refresh_full(symbol, interval, start, period=period)
+                status = 'full'
+            elif time.time() - stored[1]['fetched_at'] > self.tail_ttl:
+                bars, meta, status = await self._refresh_tail(symbol, interval, *stored)
+            else:
+                bars, meta = stored
+                status = 'hit'
+
+        if start is not None and len(bars):
+            bars = bars[np.searchsorted(bars['ts'], start):]
+        frame = bars_to_frame(np.array(bars), meta.get('tz'))
+        return frame, {"status": status, "bars": len(frame), "age": round(time.time() - meta.get('fetched_at', time.time()), 3)}
+
+    async def history_many(self, symbols: List[str], period: str, interval: str) -> Tuple[Dict[str, np.ndarray], Dict[str, str]]:
+        """
+        Bars for many symbols at once, with at most two upstream requests: one
+        download of the whole period for symbols the store lacks and one of
+        recent bars for symbols whose tail is stale.
+
+        Returns the bars within the period per symbol (symbols upstream knows
+        nothing about are left out) and the hit/tail/full status per symbol.
+        """
+        async with contextlib.AsyncExitStack() as stack:
+            # The same per-key locks as history(), taken in one order so two batches cannot deadlock
+            for key in sorted({symbol.upper() for symbol in symbols}):
+                await stack.enter_async_context(self._lock(key, interval))
+            return await self._history_many(symbols, period, interval)
+
+    async def _history_many(self, symbols: List[str], period: str, interval: str) -> Tuple[Dict[str, np.ndarray], Dict[str, str]]:
+        start = self.period_start(period)
+        stored = {symbol: self.read(symbol, interval) for symbol in symbols}
+        missing = [
+            symbol for symbol, entry in stored.items()
+            if entry is None or len(entry[0]) == 0 or not self._covers(entry[1], start)
+        ]
+        stale = [
+            symbol for symbol, entry in stored.items()
+            if symbol not in missing and time.time() - entry[1]['fetched_at'] > self.tail_ttl
+        ]
+        result = {symbol: stored[symbol][0] for symbol in symbols if symbol not in missing and symbol not in stale}
+        status = {symbol: 'hit' for symbol in result}
+
+        if missing:
+            frames = await run_upstream(
+                _download_history, missing, period=period, interval=interval, timeout=HISTORY_BATCH_TIMEOUT
+            )
+            for symbol, frame in frames.items():
+                result[symbol], _ = await self._store_full(symbol, interval, start, frame)
+                status[symbol] = 'full'
+
+        if stale:
+            # One shared start a day before the earliest anchor covers every symbol's overlap bar
+            anchor = min(int(stored[symbol][0]['ts'][max(len(stored[symbol][0]) - 2, 0)]) for symbol in stale)
+            since = pd.Timestamp(anchor - 86400, unit='s', tz='UTC').strftime('%Y-%m-%d')
+            frames = await run_upstream(
+                _download_history, stale, start=since, interval=interval, timeout=HISTORY_BATCH_TIMEOUT
+            )
+            for symbol in stale:
+                bars, meta = stored[symbol]
+                result[symbol], _, status[symbol] = await self._apply_tail(
+                    symbol, interval, bars, meta, frames.get(symbol, pd.DataFrame())
+                )
+
+        if start is not None:
+            result = {symbol: bars[np.searchsorted(bars['ts'], start):] for symbol, bars in result.items()}
+        return {symbol: np.array(bars) for symbol, bars in result.items() if len(bars)}, status
+
+
+history_store = HistoryStore(
+    root=os.getenv("HISTORY_STORE_DIR", "./db/history"),
+    tail_ttl=float(os.getenv("HISTORY_TAIL_TTL", "300")),
+)
+
+# Short-lived frames for ranges the store does not keep (intraday bars, 1d/5d periods)
+recent_history_cache = QuoteCache(
+    max_entries=int(os.getenv("RECENT_HISTORY_MAX_ENTRIES", "256")),
+    default_ttl=float(os.getenv("RECENT_HISTORY_TTL", "60")),
+)
+
+
+async def _fetch_recent(symbol: str, period: str, interval: str) -> pd.DataFrame:
+    hist = await run_upstream(_fetch_history, symbol, period=period, interval=interval)
+    return normalize_history(hist) if not hist.empty else hist
+
+
+async def load_history(symbol: str, period: str, interval: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Return normalized OHLCV bars, deriving coarse intervals from finer bars we
+    already hold before asking upstream.
+
+    Weekly, monthly and quarterly bars are built from stored daily bars. For
+    ranges outside the store, any cached finer intraday series for the same
+    period is resampled. The description reports derivedFrom when that happens.
+    """
+    if can_derive(interval, '1d') and history_store.holds(symbol, period, '1d'):
+        frame, store = await history_store.history(symbol, period, '1d')
+        frame = resample_bars(frame, interval)
+        return frame, {**store, "bars": len(frame), "derivedFrom": "1d"}
+
+    if history_store.supports(period, interval):
+        return await history_store.history(symbol, period, interval)
+
+    # Prefer the coarsest cached source so there are fewer rows to aggregate
+    for source in sorted(INTRADAY_SECONDS, key=INTRADAY_SECONDS.get, reverse=True):
+        if not can_derive(interval, source):
+            continue
+        cached = recent_history_cache.peek(symbol, f"{source}:{period}")
+        if cached is not None and not cached[0].empty:
+            frame = resample_bars(cached[0], interval)
+            return frame, {"status": "hit", "bars": len(frame), "age": round(cached[1], 3), "derivedFrom": source}
+
+    frame, cache = await recent_history_cache.get(
+        symbol, f"{interval}:{period}", lambda: _fetch_recent(symbol, period, interval)
+    )
+    return frame, {**cache, "bars": len(frame)}
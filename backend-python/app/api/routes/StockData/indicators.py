@@ -0,0 +1,243 @@
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from .history import epoch_seconds
+
+load_dotenv()
+
+# Closes that differ by more than this mean the history was re-adjusted (split/dividend)
+ADJUSTMENT_TOLERANCE = 1e-4
+
+
+def _ewm(values: np.ndarray, alpha: float, seed: Optional[float] = None) -> np.ndarray:
+    """
+    Recursive exponential average, y[i] = alpha * x[i] + (1 - alpha) * y[i - 1].
+
+    Without a seed the average starts at the first value; with one it continues
+    from a previously computed average, which is what makes extension cheap.
+    """
+    if seed is None:
+        return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    extended = np.concatenate(([seed], values))
+    return pd.Series(extended).ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+
+def _seed(previous: Dict[str, np.ndarray], name: str, start: int) -> Optional[float]:
+    return float(previous[name][start - 1]) if start > 0 else None
+
+
+def _rolling_window(close: np.ndarray, start: int, window: int) -> Tuple[np.ndarray, int]:
+    """Windows ending at each position from start on; returns them with the first position they cover"""
+    first = max(start, window - 1)
+    if first >= len(close):
+        return np.empty((0, window)), first
+    segment = close[first - window + 1:]
+    return np.lib.stride_tricks.sliding_window_view(segment, window), first
+
+
+def sma(close: np.ndarray, previous: Dict[str, np.ndarray], start: int, window: int = 20) -> Dict[str, np.ndarray]:
+    values = np.full(len(close) - start, np.nan)
+    windows, first = _rolling_window(close, start, window)
+    values[first - start:] = windows.mean(axis=1)
+    return {"value": values}
+
+
+def ema(close: np.ndarray, previous: Dict[str, np.ndarray], start: int, span: int = 20) -> Dict[str, np.ndarray]:
+    return {"value": _ewm(close[start:], 2 / (span + 1), _seed(previous, "value", start))}
+
+
+def rsi(close: np.ndarray, previous: Dict[str, np.ndarray], start: int, window: int = 14) -> Dict[str, np.ndarray]:
+    """Wilder's RSI; averages of gains and losses are kept as state for the next extension"""
+    delta = np.diff(close, prepend=close[0]) if start == 0 else np.diff(close[start - 1:])
+    gains = np.clip(delta, 0, None)
+    losses = np.clip(-delta, 0, None)
+    avg_gain = _ewm(gains, 1 / window, _seed(previous, "_gain", start))
+    avg_loss = _ewm(losses, 1 / window, _seed(previous, "_loss", start))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    # The averages need a full window of changes before they mean anything
+    positions = np.arange(start, len(close))
+    values[positions < window] = np.nan
+    return {"value": values, "_gain": avg_gain, "_loss": avg_loss}
+
+
+def macd(
+    close: np.ndarray, previous: Dict[str, np.ndarray], start: int, fast: int = 12, slow: int = 26, signal: int = 9
+) -> Dict[str, np.ndarray]:
+    fast_ema = _ewm(close[start:], 2 / (fast + 1), _seed(previous, "_fast", start))
+    slow_ema = _ewm(close[start:], 2 / (slow + 1), _seed(previous, "_slow", start))
+    line = fast_ema - slow_ema
+    signal_line = _ewm(line, 2 / (signal + 1), _seed(previous, "signal", start))
+    return {
+        "macd": line,
+        "signal": signal_line,
+        "histogram": line - signal_line,
+        "_fast": fast_ema,
+        "_slow": slow_ema,
+    }
+
+
+def bbands(
+    close: np.ndarray, previous: Dict[str, np.ndarray], start: int, window: int = 20, width: float = 2.0
+) -> Dict[str, np.ndarray]:
+    middle = np.full(len(close) - start, np.nan)
+    deviation = np.full(len(close) - start, np.nan)
+    windows, first = _rolling_window(close, start, window)
+    middle[first - start:] = windows.mean(axis=1)
+    deviation[first - start:] = windows.std(axis=1)
+    return {"middle": middle, "upper": middle + width * deviation, "lower": middle - width * deviation}
+
+
+# name -> (function, default parameters, parameter types)
+INDICATORS: Dict[str, Tuple[Callable[..., Dict[str, np.ndarray]], tuple, tuple]] = {
+    'sma': (sma, (20,), (int,)),
+    'ema': (ema, (20,), (int,)),
+    'rsi': (rsi, (14,), (int,)),
+    'macd': (macd, (12, 26, 9), (int, int, int)),
+    'bbands': (bbands, (20, 2.0), (int, float)),
+}
+
+
+def parse_indicators(spec: str) -> List[Tuple[str, tuple]]:
+    """
+    Parse a comma-separated list like "sma:50,rsi,macd:12:26:9" into (name, params).
+
+    Omitted parameters take their defaults. Raises ValueError on unknown
+    indicators or bad parameters.
+    """
+    parsed = []
+    for item in (part.strip().lower() for part in spec.split(',')):
+        if not item:
+            continue
+        name, *raw = item.split(':')
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown indicator '{name}', expected one of: {', '.join(INDICATORS)}")
+        _, defaults, types = INDICATORS[name]
+        if len(raw) > len(defaults):
+            raise ValueError(f"Indicator '{name}' takes at most {len(defaults)} parameters")
+        try:
+            params = tuple(t(v) for t, v in zip(types, raw)) + defaults[len(raw):]
+        except ValueError:
+            raise ValueError(f"Invalid parameters for indicator '{item}'")
+        if any(p <= 0 for p in params):
+            raise ValueError(f"Parameters for indicator '{item}' must be positive")
+        parsed.append((name, params))
+    if not parsed:
+        raise ValueError("No indicators requested")
+    return list(dict.fromkeys(parsed))
+
+
+def indicator_key(name: str, params: tuple) -> str:
+    return '_'.join([name] + [f"{p:g}" for p in params])
+
+
+class IndicatorSeries:
+    """Bars seen so far for one symbol and interval, with every indicator computed over them"""
+
+    def __init__(self, timestamps: np.ndarray, close: np.ndarray):
+        self.timestamps = timestamps
+        self.close = close
+        self.outputs: Dict[str, Dict[str, np.ndarray]] = {}
+
+
+class IndicatorEngine:
+    """
+    Computes technical indicators over OHLCV frames and keeps the results.
+
+    When the next request for a symbol brings the same bars plus a few new
+    ones, only the new bars (and the previously last, possibly still forming,
+    bar) are computed, continuing from the stored indicator state. A changed
+    overlap, e.g. after a split re-adjustment, or a frame reaching further back
+    than what is held triggers a full recompute.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._series: "OrderedDict[Tuple[str, str], IndicatorSeries]" = OrderedDict()
+
+    def _merge(self, key: Tuple[str, str], timestamps: np.ndarray, close: np.ndarray) -> Tuple[IndicatorSeries, int]:
+        """Return the series covering the frame and the position the frame starts at"""
+        series = self._series.get(key)
+        if series is not None and len(series.timestamps):
+            offset = int(np.searchsorted(series.timestamps, timestamps[0]))
+            settled = len(series.timestamps) - 1
+            if offset < len(series.timestamps) and series.timestamps[offset] == timestamps[0]:
+                overlap = min(settled - offset, len(timestamps))
+                if overlap >= 0 and np.array_equal(series.timestamps[offset:offset + overlap], timestamps[:overlap]) \
+                        and np.allclose(series.close[offset:offset + overlap], close[:overlap], rtol=ADJUSTMENT_TOLERANCE):
+                    if overlap == len(timestamps):
+                        return series, offset
+                    series.timestamps = np.concatenate((series.timestamps[:settled], timestamps[overlap:]))
+                    series.close = np.concatenate((series.close[:settled], close[overlap:]))
+                    # Everything from the previously last bar on is recomputed
+                    for output in series.outputs.values():
+                        for field in output:
+                            output[field] = output[field][:settled]
+                    return series, offset
+
+        series = IndicatorSeries(timestamps, close)
+        self._series[key] = series
+        while len(self._series) > self.max_entries:
+            self._series.popitem(last=False)
+        return series, 0
+
+    def compute(
+        self, symbol: str, interval: str, frame: pd.DataFrame, indicators: List[Tuple[str, tuple]]
+    ) -> Tuple[Dict[str, Dict[str, np.ndarray]], Dict[str, Any]]:
+        """
+        Compute indicators for a normalized frame.
+
+        Returns arrays aligned with the frame's rows (warm-up positions are NaN)
+        and meta with the number of bars actually computed per indicator.
+        """
+        key = (symbol.upper(), interval)
+        timestamps = epoch_seconds(frame.index)
+        close = frame['close'].to_numpy(dtype=float)
+        series, offset = self._merge(key, timestamps, close)
+        self._series.move_to_end(key)
+
+        results = {}
+        computed = {}
+        for name, params in indicators:
+            output_key = indicator_key(name, params)
+            previous = series.outputs.get(output_key)
+            first = len(next(iter(previous.values()))) if previous else 0
+            if first < len(series.close):
+                fresh = INDICATORS[name][0](series.close, previous or {}, first, *params)
+                series.outputs[output_key] = {
+                    field: np.concatenate((previous[field][:first], values)) if first else values
+                    for field, values in fresh.items()
+                }
+            computed[output_key] = len(series.close) - first
+            results[output_key] = {}
+            for field, values in series.outputs[output_key].items():
+                if field.startswith('_'):
+                    continue
+                window = values[offset:offset + len(timestamps)]
+                if offset:
+                    # The held series starts earlier, so blank the warm-up a fresh compute on this frame would have
+                    window = window.copy()
+                    window[:_warm_up(values)] = np.nan
+                results[output_key][field] = window
+
+        return results, {"bars": len(timestamps), "computed": computed}
+
+
+def _warm_up(values: np.ndarray) -> int:
+    """Number of leading NaNs, i.e. the bars an indicator needs before its first value"""
+    valid = np.flatnonzero(~np.isnan(values))
+    return int(valid[0]) if len(valid) else len(values)
+
+
+def serialize_indicator(values: np.ndarray, decimals: int = 4) -> List[Optional[float]]:
+    rounded = np.round(values, decimals)
+    return [None if np.isnan(v) else v for v in rounded.tolist()]
+
+
+indicator_engine = IndicatorEngine(max_entries=int(os.getenv("INDICATOR_CACHE_MAX_ENTRIES", "256")))
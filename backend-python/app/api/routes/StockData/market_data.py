@@ -0,0 +1,38 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+load_dotenv()
+
+MARKET_DATA_WORKERS = int(os.getenv("MARKET_DATA_WORKERS", "16"))
+MARKET_DATA_TIMEOUT = float(os.getenv("MARKET_DATA_TIMEOUT", "10"))
+SCREENER_WORKERS = int(os.getenv("SCREENER_WORKERS", "4"))
+
+# Dedicated pool so slow Yahoo calls never starve the default executor used by other routes
+executor = ThreadPoolExecutor(max_workers=MARKET_DATA_WORKERS, thread_name_prefix="market-data")
+# The screener's full-universe refreshes get their own, so they never hold up request-driven calls
+screener_executor = ThreadPoolExecutor(max_workers=SCREENER_WORKERS, thread_name_prefix="screener")
+
+
+async def run_upstream(
+    fn: Callable[..., Any], *args, timeout: Optional[float] = None, pool: Optional[ThreadPoolExecutor] = None, **kwargs
+) -> Any:
+    """
+    Run a blocking market-data call (yfinance) on the market-data pool, or on pool if given.
+
+    The event loop stays free while the call runs. If it does not finish within
+    timeout seconds (MARKET_DATA_TIMEOUT by default) a 504 is raised. A call that
+    is still queued when it times out or the request is cancelled never starts;
+    one already running finishes in the background and its result is discarded.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(pool or executor, functools.partial(fn, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout=timeout or MARKET_DATA_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Upstream market data timed out: {getattr(fn, '__name__', fn)}")
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import yfinance as yf
+from dotenv import load_dotenv
+
+from ...utils.sqlite_connections import ThreadLocalConnections
+from .market_data import run_upstream
+
+load_dotenv()
+
+# Mostly static company fields; everything price-related comes from fast_info instead
+METADATA_FIELDS = (
+    'symbol', 'longName', 'shortName', 'exchange', 'currency', 'sector', 'industry', 'website', 'logo_url', 'quoteType',
+    'sharesOutstanding'
+)
+
+
+def _fetch_metadata(symbol: str) -> Dict[str, Any]:
+    info = yf.Ticker(symbol).info
+    return {key: info[key] for key in METADATA_FIELDS if key in info}
+
+
+class MetadataStore:
+    """
+    Company metadata kept in SQLite so every worker shares it and it survives restarts.
+
+    Entries are refreshed from ticker.info at most once per ttl (a day by
+    default). If a refresh fails, the previous entry keeps being served.
+
+    Every method here blocks on SQLite, so async callers run them in a thread;
+    each thread keeps its own connection.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400.0):
+        self.path = path
+        self.ttl = ttl
+        self._db = ThreadLocalConnections(
+            path,
+            "CREATE TABLE IF NOT EXISTS company_metadata ("
+            "symbol TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        # When each symbol's stored entry was fetched, as last seen here; lets callers tell without a query
+        self._fetched_at: Dict[str, float] = {}
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._db.connect() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def get(self, symbol: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (metadata, age in seconds) regardless of freshness, or None"""
+        rows = self._execute("SELECT data, fetched_at FROM company_metadata WHERE symbol = ?", (symbol.upper(),))
+        if not rows:
+            return None
+        self._fetched_at[symbol.upper()] = rows[0][1]
+        return json.loads(rows[0][0]), time.time() - rows[0][1]
+
+    def get_many(self, symbols: List[str]) -> Dict[str, Tuple[Dict[str, Any], float]]:
+        """Like get for many symbols, in a few queries; symbols without an entry are left out"""
+        found = {}
+        now = time.time()
+        keys = [symbol.upper() for symbol in symbols]
+        # Stay under SQLite's limit on bound parameters
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self._execute(
+                f"SELECT symbol, data, fetched_at FROM company_metadata WHERE symbol IN ({','.join('?' * len(chunk))})",
+                tuple(chunk)
+            )
+            for symbol, data, fetched_at in rows:
+                self._fetched_at[symbol] = fetched_at
+                found[symbol] = (json.loads(data), now - fetched_at)
+        return found
+
+    def put(self, symbol: str, metadata: Dict[str, Any]):
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO company_metadata (symbol, data, fetched_at) VALUES (?, ?, ?)",
+            (symbol.upper(), json.dumps(metadata), now)
+        )
+        self._fetched_at[symbol.upper()] = now
+
+    def needs_fetch(self, symbol: str) -> bool:
+        """Whether load would go upstream for symbol, judged from entries seen by this process (no query)"""
+        fetched_at = self._fetched_at.get(symbol.upper())
+        return fetched_at is None or time.time() - fetched_at >= self.ttl
+
+    def all(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(symbol, json.loads(data)) for symbol, data in self._execute("SELECT symbol, data FROM company_metadata")]
+
+    async def load(self, symbol: str, pool: Optional[ThreadPoolExecutor] = None) -> Dict[str, Any]:
+        stored = await asyncio.to_thread(self.get, symbol)
+        if stored is not None and stored[1] < self.ttl:
+            return stored[0]
+
+        try:
+            metadata = await run_upstream(_fetch_metadata, symbol, pool=pool)
+        except Exception:
+            if stored is not None:
+                return stored[0]
+            raise
+
+        # Yahoo answers unknown tickers with a few stray fields; only real companies are worth keeping
+        if 'symbol' in metadata:
+            await asyncio.to_thread(self.put, symbol, metadata)
+        return metadata
+
+
+metadata_store = MetadataStore(
+    path=os.getenv("METADATA_DB", "./db/metadata.sqlite3"),
+    ttl=float(os.getenv("METADATA_TTL", "86400")),
+)
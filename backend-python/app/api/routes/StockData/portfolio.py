@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+# Bars per year, for annualizing returns and volatility
+PERIODS_PER_YEAR = {'1d': 252, '1wk': 52, '1mo': 12}
+
+
+class Holding(BaseModel):
+    symbol: str
+    weight: Optional[float] = None
+    shares: Optional[float] = None
+
+
+class PortfolioRequest(BaseModel):
+    holdings: List[Holding]
+    benchmark: str = "^GSPC"
+    period: str = "5y"
+    interval: str = "1d"
+    matrices: bool = True
+
+
+def _day_keys(ts: np.ndarray) -> np.ndarray:
+    # Bars are stamped at local midnight; rounding to the nearest UTC day recovers the
+    # calendar date for any exchange within 12 hours of UTC
+    return (ts + 43200) // 86400
+
+
+def align_closes(bars: Dict[str, np.ndarray], symbols: List[str]) -> Dict[str, Any]:
+    """
+    Line up closing prices of several symbols on their common dates.
+
+    Returns a (dates x symbols) matrix starting where every symbol has data.
+    Days on which only some exchanges traded carry the previous close forward.
+    """
+    keys = [_day_keys(bars[symbol]['ts']) for symbol in symbols]
+    days = np.unique(np.concatenate(keys))
+    closes = np.full((len(days), len(symbols)), np.nan)
+    for column, (symbol, key) in enumerate(zip(symbols, keys)):
+        closes[np.searchsorted(days, key), column] = bars[symbol]['close']
+
+    # Forward fill each column: index of the last valid row at or before every row
+    valid = ~np.isnan(closes)
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(days))[:, None], 0), axis=0)
+    closes = closes[last_valid, np.arange(len(symbols))]
+
+    first = int(max(np.argmax(valid, axis=0))) if len(symbols) else 0
+    return {"days": days[first:], "closes": closes[first:]}
+
+
+def _max_drawdown(prices: np.ndarray) -> np.ndarray:
+    """Largest peak-to-trough fall of each column, as a negative fraction"""
+    return (prices / np.maximum.accumulate(prices, axis=0) - 1).min(axis=0)
+
+
+def portfolio_analytics(closes: np.ndarray, weights: np.ndarray, benchmark: np.ndarray, periods_per_year: int) -> Dict[str, Any]:
+    """
+    Risk and return metrics for every holding and for the weighted portfolio.
+
+    closes is a (dates x holdings) matrix, benchmark the aligned benchmark
+    closes. Everything is computed on whole matrices: the covariance comes from
+    one product of the demeaned return matrix with itself and all betas from
+    one product with the benchmark returns. The portfolio is rebalanced to the
+    given weights every period.
+    """
+    returns = closes[1:] / closes[:-1] - 1
+    bench_returns = benchmark[1:] / benchmark[:-1] - 1
+    observations = len(returns)
+    years = observations / periods_per_year
+
+    centered = returns - returns.mean(axis=0)
+    bench_centered = bench_returns - bench_returns.mean()
+    covariance = centered.T @ centered / (observations - 1)
+    volatility = np.sqrt(np.diag(covariance))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = covariance / np.outer(volatility, volatility)
+        beta = centered.T @ bench_centered / (bench_centered @ bench_centered)
+
+    total_return = closes[-1] / closes[0] - 1
+    portfolio_returns = returns @ weights
+    portfolio_value = np.cumprod(np.concatenate(([1.0], 1 + portfolio_returns)))
+    portfolio_volatility = np.sqrt(weights @ covariance @ weights)
+
+    return {
+        "totalReturn": total_return,
+        "annualizedReturn": (1 + total_return) ** (1 / years) - 1,
+        "annualizedVolatility": volatility * np.sqrt(periods_per_year),
+        "beta": beta,
+        "maxDrawdown": _max_drawdown(closes),
+        "covariance": covariance * periods_per_year,
+        "correlation": correlation,
+        "portfolio": {
+            "totalReturn": portfolio_value[-1] - 1,
+            "annualizedReturn": portfolio_value[-1] ** (1 / years) - 1,
+            "annualizedVolatility": portfolio_volatility * np.sqrt(periods_per_year),
+            "beta": float(weights @ beta),
+            "maxDrawdown": float(_max_drawdown(portfolio_value[:, None])[0]),
+        },
+        "benchmark": {
+            "totalReturn": benchmark[-1] / benchmark[0] - 1,
+            "annualizedVolatility": bench_returns.std(ddof=1) * np.sqrt(periods_per_year),
+            "maxDrawdown": float(_max_drawdown(benchmark[:, None])[0]),
+        },
+        "observations": observations,
+    }
+
+
+def round_array(values: np.ndarray, decimals: int = 6) -> Any:
+    """Rounded nested lists with NaN as None, for JSON"""
+    rounded = np.round(np.asarray(values, dtype=float), decimals)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
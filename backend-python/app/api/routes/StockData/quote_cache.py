@@ -0,0 +1,132 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from ...utils.single_flight import SingleFlight
+
+load_dotenv()
+
+
+class CacheEntry:
+    __slots__ = ("value", "stored_at")
+
+    def __init__(self, value: Any, stored_at: float):
+        self.value = value
+        self.stored_at = stored_at
+
+
+class QuoteCache:
+    """
+    In-process cache for upstream quote data.
+
+    Entries are keyed by (symbol, field) so that fast-moving fields such as the
+    last price can expire sooner than slower ones like company metadata. The cache
+    is bounded and evicts the least recently used entry once full. Concurrent
+    misses for the same key share a single upstream fetch.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._inflight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def ttl_for(self, field: str) -> float:
+        return self.ttls.get(field, self.default_ttl)
+
+    def peek(self, symbol: str, field: str, allow_stale: bool = False) -> Optional[Tuple[Any, float]]:
+        """
+        Return (value, age) for a fresh entry, or None if missing or expired.
+
+        Expired entries are kept until they are refreshed or evicted so that
+        callers passing allow_stale can still serve them while a fetch is slow.
+        """
+        key = (symbol.upper(), field)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        age = time.monotonic() - entry.stored_at
+        if age > self.ttl_for(field) and not allow_stale:
+            return None
+
+        self._entries.move_to_end(key)
+        return entry.value, age
+
+    def set(self, symbol: str, field: str, value: Any):
+        key = (symbol.upper(), field)
+        self._entries[key] = CacheEntry(value, time.monotonic())
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, symbol: str, field: Optional[str] = None):
+        symbol = symbol.upper()
+        for key in [k for k in self._entries if k[0] == symbol and (field is None or k[1] == field)]:
+            del self._entries[key]
+
+    async def get(self, symbol: str, field: str, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Return the cached value for (symbol, field), calling loader on a miss.
+
+        The second element describes how the value was served: "hit" with the
+        entry age in seconds, "miss" when this call fetched it, or "coalesced"
+        when it waited on another caller's fetch.
+        """
+        cached = self.peek(symbol, field)
+        if cached is not None:
+            self.hits += 1
+            value, age = cached
+            return value, {"status": "hit", "age": round(age, 3)}
+
+        return await self._load(symbol, field, loader, count=True)
+
+    async def refresh(self, symbol: str, field: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Fetch (symbol, field) now even if the entry is fresh, sharing any fetch already in flight"""
+        value, _ = await self._load(symbol, field, loader, count=False)
+        return value
+
+    async def _load(self, symbol: str, field: str, loader: Callable[[], Awaitable[Any]], count: bool) -> Tuple[Any, Dict[str, Any]]:
+        key = (symbol.upper(), field)
+        if count:
+            if key in self._inflight:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+
+        async def load():
+            value = await loader()
+            self.set(symbol, field, value)
+            return value
+
+        value, shared = await self._inflight.do(key, load)
+        return value, {"status": "coalesced" if shared else "miss", "age": 0.0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "ttls": {field: self.ttl_for(field) for field in self.ttls},
+        }
+
+
+quote_cache = QuoteCache(
+    max_entries=int(os.getenv("QUOTE_CACHE_MAX_ENTRIES", "2048")),
+    ttls={
+        "price": float(os.getenv("QUOTE_PRICE_TTL", "15")),
+        "stats": float(os.getenv("QUOTE_STATS_TTL", "300")),
+        # Only the in-memory copy; the metadata store itself refreshes daily
+        "metadata": float(os.getenv("QUOTE_METADATA_TTL", "3600")),
+    },
+)
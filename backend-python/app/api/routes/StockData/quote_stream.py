@@ -0,0 +1,106 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+# Fields that change on every snapshot without the quote itself changing
+VOLATILE_FIELDS = ("timestamp", "cache")
+
+
+class Subscriber:
+    """
+    One streaming client.
+
+    Updates are conflated per symbol rather than queued: a client that reads
+    slower than the poller publishes only ever receives the newest quote for
+    each symbol, so memory per client is bounded by its symbol count.
+    """
+
+    def __init__(self, symbols: List[str]):
+        self.symbols = symbols
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def publish(self, symbol: str, quote: Dict[str, Any]):
+        if symbol in self.pending:
+            self.dropped += 1
+        self.pending[symbol] = quote
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> List[Dict[str, Any]]:
+        """Wait up to timeout seconds for updates and return everything pending"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+        batch, self.pending = list(self.pending.values()), {}
+        self._ready.clear()
+        return batch
+
+
+class QuoteHub:
+    """
+    Fans out quote updates from one shared poller to every streaming client.
+
+    The poller runs only while someone is subscribed and fetches the union of
+    subscribed symbols once per interval, so upstream cost follows the number
+    of distinct symbols rather than connected clients. Only quotes that changed
+    since the previous round are published.
+    """
+
+    def __init__(self, fetch: Callable[[List[str]], Awaitable[Dict[str, Dict[str, Any]]]], interval: float = 5.0):
+        self.fetch = fetch
+        self.interval = interval
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._poller: Optional[asyncio.Task] = None
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._subscribers)
+
+    def subscribe(self, symbols: List[str]) -> Subscriber:
+        subscriber = Subscriber(symbols)
+        for symbol in symbols:
+            self._subscribers.setdefault(symbol, set()).add(subscriber)
+            # New clients get the last known quote straight away instead of waiting a round
+            if symbol in self._latest:
+                subscriber.publish(symbol, self._latest[symbol])
+
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        for symbol in subscriber.symbols:
+            listeners = self._subscribers.get(symbol)
+            if listeners is None:
+                continue
+            listeners.discard(subscriber)
+            if not listeners:
+                del self._subscribers[symbol]
+                self._latest.pop(symbol, None)
+
+    @staticmethod
+    def _changed(previous: Dict[str, Any], quote: Dict[str, Any]) -> bool:
+        if previous is None:
+            return True
+        strip = lambda q: {k: v for k, v in q.items() if k not in VOLATILE_FIELDS}
+        return strip(previous) != strip(quote)
+
+    async def _poll(self):
+        while self._subscribers:
+            try:
+                quotes = await self.fetch(self.symbols)
+            except Exception as e:
+                print(f"Quote stream poll error: {str(e)}")
+                quotes = {}
+
+            for symbol, quote in quotes.items():
+                listeners = self._subscribers.get(symbol)
+                if not listeners or not self._changed(self._latest.get(symbol), quote):
+                    continue
+                self._latest[symbol] = quote
+                for subscriber in listeners:
+                    subscriber.publish(symbol, quote)
+
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,150 @@
+import asyncio
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .quote_cache import QuoteCache
+
+
+class TokenBucket:
+    """Upstream call budget: rate tokens per second, bursting up to capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RefreshAheadScheduler:
+    """
+    Keeps popular symbols warm in the quote cache.
+
+    Every quote request bumps an exponentially decaying popularity score for
+    its symbol. A background loop then re-fetches the fields of the top-N
+    symbols once they have used up (1 - lead) of their TTL, so that requests
+    keep hitting the cache instead of paying upstream latency on expiry.
+    Refreshes come out of a per-minute budget, spent in popularity order, so
+    the loop never outpaces what Yahoo will tolerate. The budget covers
+    refresh-ahead calls only; requests that miss the cache fetch on their own
+    and are not counted against it. A field listed in goes_upstream is only
+    charged when its predicate says the refresh will reach upstream, so
+    fields usually served from local storage leave the budget to the rest.
+
+    A symbol/field whose refresh fails is skipped for a number of cycles that
+    doubles with each consecutive failure, up to max_backoff, so a symbol
+    upstream keeps rejecting does not spend budget every tick.
+    """
+
+    def __init__(
+        self,
+        cache: QuoteCache,
+        loaders: Dict[str, Callable[[str], Awaitable[Any]]],
+        top_n: int = 50,
+        lead: float = 0.2,
+        budget_per_minute: float = 120,
+        half_life: float = 300,
+        min_score: float = 2.0,
+        tick: float = 1.0,
+        max_backoff: int = 300,
+        goes_upstream: Optional[Dict[str, Callable[[str], bool]]] = None,
+    ):
+        self.cache = cache
+        self.loaders = loaders
+        self.top_n = top_n
+        self.lead = lead
+        self.budget = TokenBucket(rate=budget_per_minute / 60, capacity=max(budget_per_minute / 6, 1))
+        self.half_life = half_life
+        self.min_score = min_score
+        self.tick = tick
+        self.max_backoff = max_backoff
+        self.goes_upstream = goes_upstream or {}
+        self._scores: Dict[str, Tuple[float, float]] = {}
+        self._refreshing: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        # (symbol, field) -> (consecutive failures, cycle at which to try again)
+        self._failures: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._cycle = 0
+        self.refreshed = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def _decayed(self, score: float, updated: float, now: float) -> float:
+        return score * math.exp(-(now - updated) * math.log(2) / self.half_life)
+
+    def record(self, symbol: str):
+        """Count a request for symbol and make sure the background loop is running"""
+        now = time.monotonic()
+        symbol = symbol.upper()
+        score, updated = self._scores.get(symbol, (0.0, now))
+        self._scores[symbol] = (self._decayed(score, updated, now) + 1, now)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def hot_symbols(self) -> List[Tuple[str, float]]:
+        now = time.monotonic()
+        scores = {symbol: self._decayed(score, updated, now) for symbol, (score, updated) in self._scores.items()}
+        # Forget symbols nobody has asked for in a long while
+        for symbol in [s for s, score in scores.items() if score < 0.01]:
+            del self._scores[symbol]
+            for field in self.loaders:
+                self._failures.pop((symbol, field), None)
+        ranked = sorted(((s, score) for s, score in scores.items() if score >= self.min_score), key=lambda item: -item[1])
+        return ranked[:self.top_n]
+
+    def _backing_off(self, symbol: str, field: str) -> bool:
+        failure = self._failures.get((symbol, field))
+        return failure is not None and self._cycle < failure[1]
+
+    def _due(self, symbol: str, field: str) -> bool:
+        cached = self.cache.peek(symbol, field, allow_stale=True)
+        if cached is None:
+            return True
+        return cached[1] >= self.cache.ttl_for(field) * (1 - self.lead)
+
+    async def _refresh(self, symbol: str, field: str):
+        try:
+            await self.cache.refresh(symbol, field, lambda: self.loaders[field](symbol))
+            self.refreshed += 1
+            self._failures.pop((symbol, field), None)
+        except Exception as e:
+            print(f"Refresh-ahead error for {symbol} {field}: {str(e)}")
+            self.failed += 1
+            failures = self._failures.get((symbol, field), (0, 0))[0] + 1
+            self._failures[(symbol, field)] = (failures, self._cycle + min(2 ** failures, self.max_backoff))
+        finally:
+            self._refreshing.pop((symbol, field), None)
+
+    async def _run(self):
+        while self._scores:
+            self._cycle += 1
+            for symbol, _ in self.hot_symbols():
+                for field in self.loaders:
+                    if (symbol, field) in self._refreshing or self._backing_off(symbol, field) or not self._due(symbol, field):
+                        continue
+                    charged = self.goes_upstream.get(field, lambda _: True)(symbol)
+                    if charged and not self.budget.take():
+                        self.skipped += 1
+                        continue
+                    self._refreshing[(symbol, field)] = asyncio.create_task(self._refresh(symbol, field))
+            await asyncio.sleep(self.tick)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hotSymbols": [{"symbol": s, "score": round(score, 2)} for s, score in self.hot_symbols()],
+            "refreshed": self.refreshed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "backingOff": sorted({symbol for (symbol, field) in self._failures if self._backing_off(symbol, field)}),
+            "budgetTokens": round(self.budget.tokens, 2),
+        }
@@ -0,0 +1,76 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .history import aggregate_buckets
+
+INTRADAY_SECONDS = {
+    '1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800, '60m': 3600, '90m': 5400, '1h': 3600
+}
+# Calendar bars are labelled like Yahoo's: weeks by their Monday, months and quarters by their first day
+CALENDAR_PERIODS = {'1wk': 'W-SUN', '1mo': 'M', '3mo': 'Q'}
+
+
+def can_derive(interval: str, source: str) -> bool:
+    """Whether bars of the given interval can be built from bars of the source interval"""
+    if interval == source:
+        return False
+    if interval in INTRADAY_SECONDS and source in INTRADAY_SECONDS:
+        return INTRADAY_SECONDS[interval] % INTRADAY_SECONDS[source] == 0
+    # Daily bars carry the official auction open/close, which minute bars do not
+    return interval in CALENDAR_PERIODS and source == '1d'
+
+
+def _wall_clock(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    return index.tz_localize(None) if index.tz is not None else index
+
+
+def _relabel(labels: pd.DatetimeIndex, tz) -> pd.DatetimeIndex:
+    labels = labels.tz_localize(tz) if tz is not None else labels
+    labels.name = 'date'
+    return labels
+
+
+def _session_buckets(frame: pd.DataFrame, seconds: int) -> pd.DataFrame:
+    """
+    Fixed-width intraday bars anchored to each session's first bar.
+
+    Anchoring on the session open rather than the clock hour reproduces
+    exchange-aligned bars, e.g. 09:30/10:30 hourly bars on US exchanges.
+    """
+    wall = _wall_clock(frame.index)
+    ts = wall.as_unit('s').asi8
+    day = ts // 86400
+
+    day_starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    session_open = np.repeat(ts[day_starts], np.diff(np.append(day_starts, len(ts))))
+    bucket_open = session_open + (ts - session_open) // seconds * seconds
+
+    starts = np.flatnonzero(np.r_[True, bucket_open[1:] != bucket_open[:-1]])
+    labels = pd.to_datetime(bucket_open[starts], unit='s')
+    return aggregate_buckets(frame, starts, _relabel(pd.DatetimeIndex(labels), frame.index.tz))
+
+
+def _calendar_buckets(frame: pd.DataFrame, freq: str) -> pd.DataFrame:
+    periods = _wall_clock(frame.index).to_period(freq)
+    codes = periods.asi8
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    labels = periods[starts].start_time.normalize()
+    return aggregate_buckets(frame, starts, _relabel(labels, frame.index.tz))
+
+
+def resample_bars(frame: pd.DataFrame, interval: str) -> Optional[pd.DataFrame]:
+    """
+    Build coarser OHLCV bars from a normalized, time-sorted frame of finer bars.
+
+    Returns None for intervals that cannot be derived locally. The last bar may
+    be partial, just like the still-forming bar Yahoo returns for the same range.
+    """
+    if frame.empty:
+        return frame
+    if interval in INTRADAY_SECONDS:
+        return _session_buckets(frame, INTRADAY_SECONDS[interval])
+    if interval in CALENDAR_PERIODS:
+        return _calendar_buckets(frame, CALENDAR_PERIODS[interval])
+    return None
@@ -0,0 +1,300 @@
+import asyncio
+import csv
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .metadata_store import MetadataStore
+
+load_dotenv()
+
+NUMERIC_FIELDS = ('price', 'previousClose', 'change', 'changePercent', 'volume', 'marketCap')
+CATEGORY_FIELDS = ('sector', 'industry', 'exchange', 'currency', 'quoteType')
+FILTER_PATTERN = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(.+?)\s*$')
+OPERATORS = {
+    '>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal, '=': np.equal, '!=': np.not_equal
+}
+
+
+def parse_filters(spec: str) -> List[Tuple[str, str, str]]:
+    """
+    Parse comma-separated conditions like "sector=Technology|Healthcare,marketCap>1e10".
+
+    Category fields take = and != with |-separated alternatives; numeric fields
+    take any comparison. Raises ValueError on anything else.
+    """
+    conditions = []
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        match = FILTER_PATTERN.match(item)
+        if match is None:
+            raise ValueError(f"Invalid filter '{item.strip()}'")
+        field, op, value = match.groups()
+        if field in CATEGORY_FIELDS:
+            if op not in ('=', '!='):
+                raise ValueError(f"Field '{field}' only supports = and !=")
+        elif field in NUMERIC_FIELDS:
+            try:
+                float(value)
+            except ValueError:
+                raise ValueError(f"Field '{field}' needs a number, got '{value}'")
+        else:
+            raise ValueError(f"Unknown field '{field}', expected one of: {', '.join(NUMERIC_FIELDS + CATEGORY_FIELDS)}")
+        conditions.append((field, op, value))
+    return conditions
+
+
+class Snapshot:
+    """
+    Immutable columnar view of the screener universe.
+
+    Numeric fields are float arrays (NaN where unknown) and category fields are
+    integer codes into a sorted label array, so every filter is one vectorized
+    comparison over the whole universe. complete is False while the first round
+    of prices is still coming in.
+    """
+
+    def __init__(
+        self,
+        symbols: List[str],
+        numeric: Dict[str, np.ndarray],
+        categories: Dict[str, List[Optional[str]]],
+        complete: bool = True,
+    ):
+        self.symbols = np.array(symbols, dtype=object)
+        self.numeric = numeric
+        self.labels: Dict[str, np.ndarray] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        for field, values in categories.items():
+            self.labels[field], self.codes[field] = np.unique(np.array([v or '' for v in values], dtype=str), return_inverse=True)
+        self.complete = complete
+        self.created_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def mask(self, conditions: List[Tuple[str, str, str]]) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        for field, op, value in conditions:
+            if field in self.codes:
+                wanted = [v.strip().lower() for v in value.split('|')]
+                matches = np.flatnonzero(np.isin(np.char.lower(self.labels[field]), wanted))
+                selected = np.isin(self.codes[field], matches)
+                mask &= selected if op == '=' else ~selected
+            else:
+                column = self.numeric[field]
+                # NaN compares false, so unknown values never pass a numeric filter
+                with np.errstate(invalid='ignore'):
+                    mask &= OPERATORS[op](column, float(value)) & ~np.isnan(column)
+        return mask
+
+    def select(self, mask: np.ndarray, sort: Optional[str], descending: bool, limit: int) -> np.ndarray:
+        """Indices of the top rows by sort among those in mask, without sorting all of them"""
+        candidates = np.flatnonzero(mask)
+        if sort is None:
+            return candidates[:limit]
+        keys = self.numeric[sort][candidates]
+        # Unknown values sort last either way
+        keys = np.where(np.isnan(keys), np.inf, -keys if descending else keys)
+        if limit < len(candidates):
+            top = np.argpartition(keys, limit - 1)[:limit]
+            return candidates[top[np.argsort(keys[top], kind='stable')]]
+        return candidates[np.argsort(keys, kind='stable')]
+
+    def rows(self, indices: np.ndarray) -> List[Dict[str, Any]]:
+        columns = {
+            field: [None if np.isnan(v) else v for v in np.round(values[indices], 4).tolist()]
+            for field, values in self.numeric.items()
+        }
+        columns.update({
+            field: [label or None for label in self.labels[field][codes[indices]].tolist()]
+            for field, codes in self.codes.items()
+        })
+        return [
+            {"symbol": symbol, **{field: values[i] for field, values in columns.items()}}
+            for i, symbol in enumerate(self.symbols[indices].tolist())
+        ]
+
+
+def load_universe(path: str) -> List[str]:
+    """Symbols from the symbol column of a CSV listing"""
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(dict.fromkeys(row['symbol'].strip().upper() for row in csv.DictReader(f) if row.get('symbol')))
+
+
+class Screener:
+    """
+    Periodically rebuilt snapshot of quote and company fields for a universe of symbols.
+
+    Prices come from batched downloads of chunk_size symbols and are kept by
+    the screener itself, so a large universe never crowds the quote cache.
+    Company fields come from the metadata store; every symbol it lacks (or
+    holds expired data for) is loaded metadata_concurrency at a time through
+    load_metadata, and the snapshot is re-assembled after each metadata_batch
+    symbols.
+
+    With background set, start() runs both refreshes every interval seconds
+    from startup on; only one process should do that. Otherwise a query finding
+    the last round older than interval starts a single round, so an idle
+    process never touches upstream.
+
+    Queries never wait on upstream. Until the first round of prices is in,
+    they get a partial snapshot that fills in as chunks arrive, marked
+    complete=False; after that they run against the last complete one.
+    """
+
+    def __init__(
+        self,
+        universe: Callable[[], List[str]],
+        fetch_prices: Callable[[List[str]], Awaitable[Dict[str, dict]]],
+        metadata: MetadataStore,
+        interval: float = 300.0,
+        chunk_size: int = 200,
+        metadata_batch: int = 100,
+        metadata_concurrency: int = 8,
+        load_metadata: Optional[Callable[[str], Awaitable[Dict[str, Any]]]] = None,
+        background: bool = False,
+    ):
+        self.universe = universe
+        self.fetch_prices = fetch_prices
+        self.metadata = metadata
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.metadata_batch = metadata_batch
+        self.metadata_concurrency = metadata_concurrency
+        self.load_metadata = load_metadata or metadata.load
+        self.background = background
+        self._snapshot: Optional[Snapshot] = None
+        self._symbols: List[str] = []
+        self._prices: Dict[str, dict] = {}
+        self._company: Dict[str, Dict[str, Any]] = {}
+        self._complete = False
+        self._tasks: List[asyncio.Task] = []
+        self._round_started: Optional[float] = None
+
+    def _assemble(self, symbols: List[str], prices: Dict[str, dict], company: Dict[str, Dict[str, Any]], complete: bool) -> Snapshot:
+        numeric = {field: np.full(len(symbols), np.nan) for field in NUMERIC_FIELDS}
+        categories: Dict[str, List[Optional[str]]] = {field: [None] * len(symbols) for field in CATEGORY_FIELDS}
+        shares = np.full(len(symbols), np.nan)
+        for i, symbol in enumerate(symbols):
+            price = prices.get(symbol)
+            if price:
+                numeric['price'][i] = price['lastPrice'] or np.nan
+                numeric['previousClose'][i] = price['previousClose'] or np.nan
+                numeric['volume'][i] = price['volume'] or np.nan
+            info = company.get(symbol, {})
+            shares[i] = info.get('sharesOutstanding') or np.nan
+            for field in CATEGORY_FIELDS:
+                categories[field][i] = info.get(field)
+
+        numeric['change'] = numeric['price'] - numeric['previousClose']
+        numeric['changePercent'] = numeric['change'] / numeric['previousClose'] * 100
+        # Shares outstanding barely move, so market cap follows the price without a per-symbol call
+        numeric['marketCap'] = shares * numeric['price']
+        return Snapshot(symbols, numeric, categories, complete)
+
+    async def _publish(self):
+        # Assembling the whole universe takes a while; keep it off the event loop
+        self._snapshot = await asyncio.to_thread(
+            self._assemble, self._symbols, self._prices, self._company, self._complete
+        )
+
+    async def _load_stored(self) -> Dict[str, Tuple[Dict[str, Any], float]]:
+        self._symbols = self.universe()
+        stored = await asyncio.to_thread(self.metadata.get_many, self._symbols)
+        self._company = {symbol: info for symbol, (info, _) in stored.items()}
+        return stored
+
+    async def _refresh_prices(self):
+        self._symbols = self.universe()
+        prices: Dict[str, dict] = {}
+        for i in range(0, len(self._symbols), self.chunk_size):
+            try:
+                prices.update(await self.fetch_prices(self._symbols[i:i + self.chunk_size]))
+            except Exception as e:
+                print(f"Screener price refresh error: {str(e)}")
+            if not self._complete:
+                # No complete round to fall back on yet, so show prices as they arrive
+                self._prices = prices
+                await self._publish()
+        self._prices = prices
+        self._complete = True
+        await self._publish()
+
+    async def _fill_metadata(self):
+        """Load company fields for every symbol the store lacks or holds expired data for"""
+        stored = await self._load_stored()
+        todo = [s for s in self._symbols if s not in stored or stored[s][1] >= self.metadata.ttl]
+        semaphore = asyncio.Semaphore(self.metadata_concurrency)
+
+        async def load(symbol: str):
+            async with semaphore:
+                try:
+                    self._company[symbol] = await self.load_metadata(symbol)
+                except Exception as e:
+                    print(f"Screener metadata error for {symbol}: {str(e)}")
+
+        for i in range(0, len(todo), self.metadata_batch):
+            await asyncio.gather(*(load(symbol) for symbol in todo[i:i + self.metadata_batch]))
+            # New company fields show up right away, on top of the prices already held
+            await self._publish()
+
+    async def _once(self, step: Callable[[], Awaitable[None]], name: str):
+        try:
+            await step()
+        except Exception as e:
+            print(f"Screener {name} error: {str(e)}")
+
+    async def _every_interval(self, step: Callable[[], Awaitable[None]], name: str):
+        while True:
+            await self._once(step, name)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the price and metadata refresh loops if background is set, unless they are already running"""
+        if not self.background:
+            return
+        if self._tasks and not any(task.done() for task in self._tasks):
+            return
+        self.stop()
+        self._tasks = [
+            asyncio.create_task(self._every_interval(self._refresh_prices, "price refresh")),
+            asyncio.create_task(self._every_interval(self._fill_metadata, "metadata refresh")),
+        ]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def _refresh_on_demand(self):
+        """Start one round of both refreshes if none is running and the last started over interval ago"""
+        if any(not task.done() for task in self._tasks):
+            return
+        if self._round_started is not None and time.monotonic() - self._round_started < self.interval:
+            return
+        self._round_started = time.monotonic()
+        self._tasks = [
+            asyncio.create_task(self._once(self._refresh_prices, "price refresh")),
+            asyncio.create_task(self._once(self._fill_metadata, "metadata refresh")),
+        ]
+
+    async def snapshot(self) -> Snapshot:
+        """The current snapshot, partial until the first round of prices is in"""
+        if self.background:
+            self.start()
+        else:
+            self._refresh_on_demand()
+        if self._snapshot is None:
+            # Nothing assembled yet: answer from the stored company fields alone
+            if not self._symbols:
+                await self._load_stored()
+            await self._publish()
+        return self._snapshot
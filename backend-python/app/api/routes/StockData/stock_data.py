@@ -1,10 +1,138 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Literal, Optional
+import asyncio
+import json
+import numpy as np
+import os
 import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from .history import DOWNSAMPLERS, epoch_seconds, serialize_history
+from .history_store import history_store, load_history
+from .indicators import indicator_engine, parse_indicators, serialize_indicator
+from .market_data import run_upstream, screener_executor
+from .metadata_store import metadata_store
+from .portfolio import PERIODS_PER_YEAR, PortfolioRequest, align_closes, portfolio_analytics, round_array
+from .quote_cache import quote_cache
+from .quote_stream import QuoteHub
+from .refresh_ahead import RefreshAheadScheduler
+from .screener import CATEGORY_FIELDS, NUMERIC_FIELDS, Screener, load_universe, parse_filters
+from .symbol_index import SYMBOL_LISTING_FILE, TICKER_PATTERN, SymbolIndex, symbol_index
 
 router = APIRouter()
 
+QUOTES_MAX_SYMBOLS = int(os.getenv("QUOTES_MAX_SYMBOLS", "100"))
+QUOTES_CONCURRENCY = int(os.getenv("QUOTES_CONCURRENCY", "8"))
+QUOTES_DEADLINE = float(os.getenv("QUOTES_DEADLINE", "5"))
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "5"))
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+INDICATORS_MAX_SYMBOLS = int(os.getenv("INDICATORS_MAX_SYMBOLS", "20"))
+PORTFOLIO_MAX_SYMBOLS = int(os.getenv("PORTFOLIO_MAX_SYMBOLS", "200"))
+SCREENER_UNIVERSE_FILE = os.getenv("SCREENER_UNIVERSE_FILE", SYMBOL_LISTING_FILE)
+SCREENER_REFRESH_INTERVAL = float(os.getenv("SCREENER_REFRESH_INTERVAL", "300"))
+SCREENER_CHUNK_SIZE = int(os.getenv("SCREENER_CHUNK_SIZE", "200"))
+SCREENER_METADATA_BATCH = int(os.getenv("SCREENER_METADATA_BATCH", "100"))
+SCREENER_METADATA_CONCURRENCY = int(os.getenv("SCREENER_METADATA_CONCURRENCY", "8"))
+# Refresh the screener universe from startup on; enable it in one process only
+SCREENER_BACKGROUND_REFRESH = os.getenv("SCREENER_BACKGROUND_REFRESH", "false").lower() == "true"
+
+def _price_from_history(hist) -> Optional[dict]:
+    """Last price, previous close and volume from the daily bars of a few recent sessions"""
+    if hist is None or hist.empty or 'Close' not in hist.columns:
+        return None
+    hist = hist[hist['Close'].notna()]
+    if hist.empty:
+        return None
+    closes = hist['Close']
+    return {
+        "lastPrice": float(closes.iloc[-1]),
+        "previousClose": float(closes.iloc[-2]) if len(closes) > 1 else None,
+        "volume": int(hist['Volume'].iloc[-1]) if 'Volume' in hist.columns else 0
+    }
+
+
+def _fetch_price(symbol: str) -> dict:
+    ticker = yf.Ticker(symbol)
+    # Get current price data - use fast_info for better performance
+    try:
+        fast_info = ticker.fast_info
+        return {
+            "lastPrice": fast_info.get('lastPrice', 0),
+            "previousClose": fast_info.get('previousClose'),
+            "volume": fast_info.get('lastVolume', 0)
+        }
+    except Exception:
+        # Fallback to daily interval if fast_info fails
+        price = _price_from_history(ticker.history(period="5d", interval="1d"))
+        if price is None:
+            raise HTTPException(status_code=404, detail=f"No data found for symbol: {symbol}")
+        return price
+
+
+def _fetch_stats(symbol: str) -> dict:
+    fast_info = yf.Ticker(symbol).fast_info
+    return {
+        "marketCap": fast_info.get('marketCap', 0),
+        "fiftyTwoWeekHigh": fast_info.get('yearHigh', 0),
+        "fiftyTwoWeekLow": fast_info.get('yearLow', 0)
+    }
+
+
+def _batch_price(data, symbol: str) -> Optional[dict]:
+    """Extract a price snapshot for a symbol from a yf.download frame"""
+    if (hasattr(data.columns, 'levels') and
+        len(data.columns.levels) > 0 and
+        symbol in data.columns.levels[0]):
+        return _price_from_history(data[symbol])
+    elif not data.empty and 'Close' in data.columns:
+        # Single column dataframe
+        return _price_from_history(data)
+    return None
+
+
+# Static company metadata lives in SQLite and is refreshed daily; price and stats come from fast_info
+QUOTE_LOADERS = {
+    "metadata": metadata_store.load,
+    "price": lambda symbol: run_upstream(_fetch_price, symbol),
+    "stats": lambda symbol: run_upstream(_fetch_stats, symbol),
+}
+
+
+async def _cached(symbol: str, field: str):
+    return await quote_cache.get(symbol, field, lambda: QUOTE_LOADERS[field](symbol))
+
+
+def _observe_symbol(symbol: str, metadata: dict, index: SymbolIndex = symbol_index):
+    """Add symbols seen in quote responses to the search index"""
+    name = metadata.get('longName') or metadata.get('shortName')
+    if name:
+        index.add(
+            symbol, name, metadata.get('exchange'),
+            sector=metadata.get('sector'), industry=metadata.get('industry')
+        )
+
+
+def _price_change(price: dict):
+    current_price = price['lastPrice']
+    previous_close = price.get('previousClose') or current_price
+    change = current_price - previous_close
+    change_percent = (change / previous_close) * 100 if previous_close else 0
+    return current_price, previous_close, change, change_percent
+
+
+refresh_ahead = RefreshAheadScheduler(
+    quote_cache,
+    loaders=QUOTE_LOADERS,
+    top_n=int(os.getenv("REFRESH_AHEAD_TOP_N", "50")),
+    lead=float(os.getenv("REFRESH_AHEAD_LEAD", "0.2")),
+    budget_per_minute=float(os.getenv("REFRESH_AHEAD_BUDGET", "120")),
+    max_backoff=int(os.getenv("REFRESH_AHEAD_MAX_BACKOFF", "300")),
+    # Metadata refreshes usually just re-read SQLite, so they only cost budget once the stored entry expires
+    goes_upstream={"metadata": metadata_store.needs_fetch},
+)
+
+
 @router.get("/quote")
 async def get_stock_quote(symbol: str):
     """
@@ -15,199 +143,329 @@ async def get_stock_quote(symbol: str):
     
     Returns:
         JSON with stock data including price, change, volume, etc.
+        The cache field reports hit/miss status and age for the metadata, price and stats data.
     """
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        
-        # Get current price data - use fast_info for better performance
-        try:
-            fast_info = ticker.fast_info
-            current_price = fast_info.get('lastPrice', 0)
-        except Exception:
-            # Fallback to daily interval if fast_info fails
-            hist = ticker.history(period="1d", interval="1d")
-            if hist.empty or len(hist) == 0:
-                raise HTTPException(status_code=404, detail=f"No data found for symbol: {symbol}")
-            current_price = hist['Close'].iloc[-1]
-        
-        previous_close = info.get('previousClose', current_price)
-        change = current_price - previous_close
-        change_percent = (change / previous_close) * 100 if previous_close else 0
+        refresh_ahead.record(symbol)
+        (metadata, metadata_cache), (price, price_cache), (stats, stats_cache) = await asyncio.gather(
+            _cached(symbol, "metadata"), _cached(symbol, "price"), _cached(symbol, "stats")
+        )
+        current_price, previous_close, change, change_percent = _price_change(price)
+        _observe_symbol(symbol, metadata)
         
         return {
             "symbol": symbol.upper(),
-            "companyName": info.get('longName', symbol),
+            "companyName": metadata.get('longName', symbol),
             "currentPrice": round(current_price, 2),
             "previousClose": round(previous_close, 2),
             "change": round(change, 2),
             "changePercent": round(change_percent, 2),
-            "volume": info.get('volume', 0),
-            "marketCap": info.get('marketCap', 0),
-            "currency": info.get('currency', 'USD'),
-            "exchange": info.get('exchange', 'N/A'),
-            "sector": info.get('sector', 'N/A'),
-            "industry": info.get('industry', 'N/A'),
-            "website": info.get('website', 'N/A'),
-            "logo": info.get('logo_url', ''),
-            "fiftyTwoWeekHigh": info.get('fiftyTwoWeekHigh', 0),
-            "fiftyTwoWeekLow": info.get('fiftyTwoWeekLow', 0),
-            "timestamp": datetime.now().isoformat()
+            "volume": price.get('volume', 0),
+            "marketCap": stats.get('marketCap', 0),
+            "currency": metadata.get('currency', 'USD'),
+            "exchange": metadata.get('exchange', 'N/A'),
+            "sector": metadata.get('sector', 'N/A'),
+            "industry": metadata.get('industry', 'N/A'),
+            "website": metadata.get('website', 'N/A'),
+            "logo": metadata.get('logo_url', ''),
+            "fiftyTwoWeekHigh": stats.get('fiftyTwoWeekHigh', 0),
+            "fiftyTwoWeekLow": stats.get('fiftyTwoWeekLow', 0),
+            "timestamp": datetime.now().isoformat(),
+            "cache": {"metadata": metadata_cache, "price": price_cache, "stats": stats_cache}
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching stock data: {str(e)}")
 
 
+def _multi_quote_payload(symbol: str, metadata: dict, price: dict, stats: dict, cache: dict) -> dict:
+    current_price, previous_close, change, change_percent = _price_change(price)
+    
+    return {
+        "symbol": symbol,
+        "companyName": metadata.get('longName', symbol),
+        "currentPrice": round(current_price, 2),
+        "previousClose": round(previous_close, 2),
+        "change": round(change, 2),
+        "changePercent": round(change_percent, 2),
+        "volume": price.get('volume', 0),
+        "marketCap": stats.get('marketCap', 0),
+        "currency": metadata.get('currency', 'USD'),
+        "logo": metadata.get('logo_url', ''),
+        "timestamp": datetime.now().isoformat(),
+        "cache": cache
+    }
+
+
+async def _enrich_quote(symbol: str, semaphore: asyncio.Semaphore, record: bool = True) -> dict:
+    async with semaphore:
+        try:
+            # Stream polls are not client requests and should not make a symbol look popular
+            if record:
+                refresh_ahead.record(symbol)
+            metadata_result, price_result, stats_result = await asyncio.gather(
+                _cached(symbol, "metadata"), _cached(symbol, "price"), _cached(symbol, "stats"),
+                return_exceptions=True
+            )
+            if isinstance(metadata_result, Exception):
+                raise metadata_result
+            
+            if isinstance(price_result, Exception) or not price_result[0].get('lastPrice'):
+                return {
+                    "symbol": symbol,
+                    "error": "No data available"
+                }
+            
+            if isinstance(stats_result, Exception):
+                raise stats_result
+            
+            metadata, metadata_cache = metadata_result
+            stats, stats_cache = stats_result
+            _observe_symbol(symbol, metadata)
+            price, price_cache = price_result
+            cache = {"metadata": metadata_cache, "price": price_cache, "stats": stats_cache}
+            return _multi_quote_payload(symbol, metadata, price, stats, cache)
+        except Exception as e:
+            return {
+                "symbol": symbol,
+                "error": str(e)
+            }
+
+
+def _unfinished_quote(symbol: str) -> dict:
+    """Serve expired cache data for a symbol that missed the deadline, if there is any"""
+    cached = {field: quote_cache.peek(symbol, field, allow_stale=True) for field in QUOTE_LOADERS}
+    price = cached["price"]
+    if cached["metadata"] is None or price is None or not price[0].get('lastPrice'):
+        return {"symbol": symbol, "status": "pending"}
+    
+    stats = cached["stats"][0] if cached["stats"] is not None else {}
+    cache = {
+        field: {"status": "stale", "age": round(entry[1], 3)}
+        for field, entry in cached.items() if entry is not None
+    }
+    return {**_multi_quote_payload(symbol, cached["metadata"][0], price[0], stats, cache), "status": "stale"}
+
+
+# Enrichment tasks that outlived their request; they keep running to warm the cache
+_background_tasks = set()
+
+
+def _parse_symbols(symbols: str, max_symbols: int) -> List[str]:
+    symbol_list = list(dict.fromkeys(s.strip().upper() for s in symbols.split(',') if s.strip()))
+    if len(symbol_list) > max_symbols:
+        raise HTTPException(status_code=400, detail=f"Too many symbols: {len(symbol_list)} requested, limit is {max_symbols}")
+    return symbol_list
+
+
+async def _download_prices(
+    symbols: List[str], timeout: Optional[float] = None, pool: Optional[ThreadPoolExecutor] = None
+) -> Dict[str, dict]:
+    """Fetch price snapshots for many symbols in one batched download"""
+    prices = {}
+    if not symbols:
+        return prices
+    try:
+        # A few sessions so the previous close comes from the same download
+        data = await run_upstream(
+            yf.download, tickers=symbols, period="5d", interval="1d", group_by='ticker', progress=False,
+            timeout=timeout, pool=pool
+        )
+    except Exception:
+        # Symbols missing from the batch fall back to fast_info
+        return prices
+    
+    for symbol in symbols:
+        try:
+            price = _batch_price(data, symbol)
+        except Exception:
+            price = None
+        if price and price['lastPrice']:
+            prices[symbol] = price
+    return prices
+
+
+async def _refresh_prices(symbols: List[str], timeout: Optional[float] = None) -> Dict[str, dict]:
+    """Batch download prices for symbols being quoted and put them in the quote cache"""
+    prices = await _download_prices(symbols, timeout=timeout)
+    for symbol, price in prices.items():
+        quote_cache.set(symbol, "price", price)
+    return prices
+
+
 @router.get("/quotes")
-async def get_multiple_stock_quotes(symbols: str):
+async def get_multiple_stock_quotes(
+    symbols: str,
+    max_symbols: int = Query(QUOTES_MAX_SYMBOLS, ge=1, le=QUOTES_MAX_SYMBOLS),
+    deadline: float = Query(QUOTES_DEADLINE, gt=0, le=60)
+):
     """
     Get real-time stock quotes for multiple symbols
     
     Args:
         symbols: Comma-separated stock ticker symbols (e.g., 'AAPL,TSLA,GOOGL')
+        max_symbols: Maximum number of symbols accepted in one request
+        deadline: Seconds to wait for per-symbol data before answering with what is ready
     
     Returns:
-        JSON array with stock data for each symbol
+        JSON array with stock data for each symbol. Symbols that miss the deadline
+        come back with status "stale" (expired cached data) or "pending" (no data yet).
     """
     try:
-        symbol_list = [s.strip().upper() for s in symbols.split(',')]
+        symbol_list = _parse_symbols(symbols, max_symbols)
         
-        # Use batch download for better performance
-        try:
-            # Download all stocks in parallel
-            data = yf.download(tickers=symbol_list, period="1d", interval="1d", group_by='ticker', progress=False)
-            
-            results = []
-            for symbol in symbol_list:
-                try:
-                    ticker = yf.Ticker(symbol)
-                    info = ticker.info
-                    
-                    # Get current price from batch data or fast_info
-                    try:
-                        # Try to get from batch download data
-                        if (hasattr(data.columns, 'levels') and 
-                            len(data.columns.levels) > 0 and 
-                            symbol in data.columns.levels[0]):
-                            close_series = data[symbol]['Close']
-                            current_price = close_series.iloc[-1] if not close_series.empty and len(close_series) > 0 else None
-                        elif not data.empty and 'Close' in data.columns:
-                            # Single column dataframe - get last close price
-                            close_series = data['Close']
-                            current_price = close_series.iloc[-1] if not close_series.empty and len(close_series) > 0 else None
-                        else:
-                            current_price = None
-                        
-                        # Fallback to fast_info if batch data fails
-                        if current_price is None or current_price == 0:
-                            fast_info = ticker.fast_info
-                            current_price = fast_info.get('lastPrice', 0)
-                    except Exception:
-                        # Final fallback to fast_info
-                        try:
-                            fast_info = ticker.fast_info
-                            current_price = fast_info.get('lastPrice', 0)
-                        except Exception:
-                            current_price = 0
-                    
-                    if current_price == 0 or current_price is None:
-                        results.append({
-                            "symbol": symbol,
-                            "error": "No data available"
-                        })
-                        continue
-                    
-                    previous_close = info.get('previousClose', current_price)
-                    change = current_price - previous_close
-                    change_percent = (change / previous_close) * 100 if previous_close else 0
-                    
-                    results.append({
-                        "symbol": symbol,
-                        "companyName": info.get('longName', symbol),
-                        "currentPrice": round(current_price, 2),
-                        "previousClose": round(previous_close, 2),
-                        "change": round(change, 2),
-                        "changePercent": round(change_percent, 2),
-                        "volume": info.get('volume', 0),
-                        "marketCap": info.get('marketCap', 0),
-                        "currency": info.get('currency', 'USD'),
-                        "logo": info.get('logo_url', ''),
-                        "timestamp": datetime.now().isoformat()
-                    })
-                except Exception as e:
-                    results.append({
-                        "symbol": symbol,
-                        "error": str(e)
-                    })
-        except Exception:
-            # Fallback to sequential fetching if batch fails
-            results = []
-            for symbol in symbol_list:
-                try:
-                    ticker = yf.Ticker(symbol)
-                    info = ticker.info
-                    
-                    try:
-                        fast_info = ticker.fast_info
-                        current_price = fast_info.get('lastPrice', 0)
-                    except Exception:
-                        hist = ticker.history(period="1d", interval="1d")
-                        if hist.empty or len(hist) == 0:
-                            results.append({
-                                "symbol": symbol,
-                                "error": "No data available"
-                            })
-                            continue
-                        current_price = hist['Close'].iloc[-1]
-                    
-                    previous_close = info.get('previousClose', current_price)
-                    change = current_price - previous_close
-                    change_percent = (change / previous_close) * 100 if previous_close else 0
-                    
-                    results.append({
-                        "symbol": symbol,
-                        "companyName": info.get('longName', symbol),
-                        "currentPrice": round(current_price, 2),
-                        "previousClose": round(previous_close, 2),
-                        "change": round(change, 2),
-                        "changePercent": round(change_percent, 2),
-                        "volume": info.get('volume', 0),
-                        "marketCap": info.get('marketCap', 0),
-                        "currency": info.get('currency', 'USD'),
-                        "logo": info.get('logo_url', ''),
-                        "timestamp": datetime.now().isoformat()
-                    })
-                except Exception as e:
-                    results.append({
-                        "symbol": symbol,
-                        "error": str(e)
-                    })
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        
+        # Batch download prices only for symbols without a fresh cached price
+        await _refresh_prices([s for s in symbol_list if quote_cache.peek(s, "price") is None], timeout=deadline)
+        
+        semaphore = asyncio.Semaphore(QUOTES_CONCURRENCY)
+        tasks = {symbol: asyncio.create_task(_enrich_quote(symbol, semaphore)) for symbol in symbol_list}
+        remaining = max(deadline - (loop.time() - started), 0)
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=remaining)
+        
+        results = []
+        for symbol, task in tasks.items():
+            if task.done():
+                results.append(task.result())
+            else:
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+                results.append(_unfinished_quote(symbol))
         
         return {"data": results}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching stock data: {str(e)}")
 
 
+async def _stream_snapshot(symbols: List[str]) -> Dict[str, dict]:
+    """One poll for the quote stream: a single batched price refresh for every subscribed symbol"""
+    await _refresh_prices(symbols)
+    semaphore = asyncio.Semaphore(QUOTES_CONCURRENCY)
+    quotes = await asyncio.gather(*[_enrich_quote(symbol, semaphore, record=False) for symbol in symbols])
+    return {quote["symbol"]: quote for quote in quotes}
+
+
+quote_hub = QuoteHub(fetch=_stream_snapshot, interval=STREAM_POLL_INTERVAL)
+
+
+@router.get("/stream")
+async def stream_stock_quotes(
+    request: Request,
+    symbols: str,
+    max_symbols: int = Query(QUOTES_MAX_SYMBOLS, ge=1, le=QUOTES_MAX_SYMBOLS)
+):
+    """
+    Stream quote updates for the given symbols as Server-Sent Events
+    
+    Args:
+        symbols: Comma-separated stock ticker symbols (e.g., 'AAPL,TSLA,GOOGL')
+        max_symbols: Maximum number of symbols accepted in one request
+    
+    Returns:
+        An event stream. Each "quotes" event carries the quotes that changed since
+        the client's previous event, in the same shape as /quotes, plus a count of
+        updates superseded before the client read them. Comment lines keep idle
+        connections alive.
+    """
+    symbol_list = _parse_symbols(symbols, max_symbols)
+    
+    async def events():
+        # Subscribe only once the body is being sent, so the finally below always gets to unsubscribe
+        subscriber = quote_hub.subscribe(symbol_list)
+        try:
+            while not await request.is_disconnected():
+                batch = await subscriber.next_batch(timeout=STREAM_KEEPALIVE)
+                if batch:
+                    yield f"event: quotes\ndata: {json.dumps({'data': batch, 'dropped': subscriber.dropped})}\n\n"
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            quote_hub.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Quote cache and refresh-ahead counters, for tuning TTLs and the upstream budget
+    
+    Returns:
+        Cache size and hit/miss/coalesced counts, plus the current hot symbols
+    """
+    return {"quoteCache": quote_cache.stats(), "refreshAhead": refresh_ahead.stats()}
+
+
+_symbol_index_lock = asyncio.Lock()
+
+
+def _build_symbol_index() -> SymbolIndex:
+    index = SymbolIndex()
+    index.load_listing(SYMBOL_LISTING_FILE)
+    for symbol, metadata in metadata_store.all():
+        _observe_symbol(symbol, metadata, index)
+    return index
+
+
+async def _ensure_symbol_index():
+    """Build the search index on first use from the listing file and every symbol already in the metadata store"""
+    if symbol_index.loaded:
+        return
+    async with _symbol_index_lock:
+        if symbol_index.loaded:
+            return
+        # Reading the listing and the metadata store blocks; build a separate index in a thread and take it over
+        symbol_index.absorb(await asyncio.to_thread(_build_symbol_index))
+        symbol_index.loaded = True
+
+
+def _search_result(entry: dict) -> dict:
+    return {
+        "symbol": entry['symbol'],
+        "companyName": entry['name'],
+        "exchange": entry.get('exchange') or 'N/A',
+        "sector": entry.get('sector') or 'N/A',
+        "industry": entry.get('industry') or 'N/A'
+    }
+
+
 @router.get("/search")
-async def search_stocks(query: str):
+async def search_stocks(query: str, limit: int = Query(10, ge=1, le=50)):
     """
     Search for stocks by company name or symbol
     
     Args:
-        query: Search term (company name or ticker symbol)
+        query: Search term (company name or ticker symbol), matched by prefix with typo tolerance
+        limit: Maximum number of results
     
     Returns:
-        List of matching stocks
+        List of matching stocks, best match first
     """
     try:
-        # Using yfinance's search functionality
-        # Note: This is a simplified search. For better results, consider using a dedicated stock search API
-        ticker = yf.Ticker(query)
-        info = ticker.info
+        await _ensure_symbol_index()
+        matches = symbol_index.search(query, limit)
+        if matches:
+            return {"data": [_search_result(entry) for entry in matches]}
+        
+        # Unknown to the index: if the query could be a ticker, look it up upstream
+        if not TICKER_PATTERN.match(query.strip()):
+            return {"data": []}
+        info, _ = await _cached(query.strip(), "metadata")
         
         if 'symbol' not in info:
             return {"data": []}
         
+        _observe_symbol(info['symbol'], info)
         return {
             "data": [{
                 "symbol": info.get('symbol', query),
@@ -222,7 +480,14 @@ async def search_stocks(query: str):
 
 
 @router.get("/history")
-async def get_stock_history(symbol: str, period: str = "1mo", interval: str = "1d"):
+async def get_stock_history(
+    symbol: str,
+    period: str = "1mo",
+    interval: str = "1d",
+    format: Literal["records", "columnar"] = "records",
+    max_points: Optional[int] = Query(None, ge=3),
+    downsample: Literal["lttb", "ohlc"] = "lttb"
+):
     """
     Get historical stock data
     
@@ -230,43 +495,274 @@ async def get_stock_history(symbol: str, period: str = "1mo", interval: str = "1
         symbol: Stock ticker symbol
         period: Time period (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)
         interval: Data interval (1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo)
+        format: "records" for a list of OHLCV objects, or "columnar" for parallel
+            arrays (timestamps, open, high, low, close, volume)
+        max_points: Reduce the series to at most this many points before serializing
+        downsample: "lttb" keeps the points that best preserve the close line shape,
+            "ohlc" merges neighbouring bars into candles
     
     Returns:
-        Historical price data
+        Historical price data. Daily and longer intervals are served from the local
+        history store, and coarser intervals are derived from finer bars already
+        held where possible; the store field reports whether upstream was hit.
     """
     try:
-        ticker = yf.Ticker(symbol)
-        hist = ticker.history(period=period, interval=interval)
+        frame, store = await load_history(symbol, period, interval)
         
-        if hist.empty:
+        if frame.empty:
             raise HTTPException(status_code=404, detail=f"No historical data found for symbol: {symbol}")
         
-        # Convert to list of dictionaries using to_dict('records') for better performance
-        hist_reset = hist.reset_index()
-        hist_reset.rename(columns={'Date': 'date', 'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'}, inplace=True)
-        data = hist_reset.to_dict('records')
-        
-        # Format the data properly with rounded values
-        formatted_data = []
-        for record in data:
-            formatted_record = {
-                "date": record['date'].isoformat() if hasattr(record['date'], 'isoformat') else str(record['date']),
-                "open": round(float(record['open']), 2),
-                "high": round(float(record['high']), 2),
-                "low": round(float(record['low']), 2),
-                "close": round(float(record['close']), 2),
-                "volume": int(record['volume'])
-            }
-            formatted_data.append(formatted_record)
-        
-        data = formatted_data
-        
-        return {
+        response = {
             "symbol": symbol.upper(),
             "period": period,
             "interval": interval,
-            "data": data
+            "format": format,
+            "store": store
         }
+        
+        if max_points is not None and len(frame) > max_points:
+            points = len(frame)
+            frame = DOWNSAMPLERS[downsample](frame, max_points)
+            response["downsample"] = {"method": downsample, "from": points, "to": len(frame)}
+        
+        response["data"] = serialize_history(frame, format)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching historical data: {str(e)}")
 
+
+async def _symbol_indicators(symbol: str, period: str, interval: str, indicators: list, points: Optional[int]) -> dict:
+    frame, store = await load_history(symbol, period, interval)
+    if frame.empty:
+        return {"symbol": symbol, "error": f"No historical data found for symbol: {symbol}"}
+    
+    results, meta = indicator_engine.compute(symbol, interval, frame, indicators)
+    window = slice(-points, None) if points else slice(None)
+    return {
+        "symbol": symbol,
+        "store": store,
+        "computed": meta["computed"],
+        "timestamps": epoch_seconds(frame.index)[window].tolist(),
+        "indicators": {
+            name: {field: serialize_indicator(values[window]) for field, values in output.items()}
+            for name, output in results.items()
+        }
+    }
+
+
+@router.get("/indicators")
+async def get_stock_indicators(
+    symbols: str,
+    indicators: str = "sma,ema,rsi,macd,bbands",
+    period: str = "1y",
+    interval: str = "1d",
+    points: Optional[int] = Query(None, ge=1)
+):
+    """
+    Get technical indicators computed from historical closes
+    
+    Args:
+        symbols: Comma-separated stock ticker symbols
+        indicators: Comma-separated indicators with optional colon-separated parameters:
+            sma:window, ema:span, rsi:window, macd:fast:slow:signal, bbands:window:width
+            (e.g. 'sma:50,rsi:14,macd')
+        period: Time period, as for /history
+        interval: Data interval, as for /history
+        points: Only return the most recent points of each series
+    
+    Returns:
+        Per-symbol timestamps (epoch seconds) and indicator arrays aligned with them,
+        null during each indicator's warm-up. Results are kept between requests, so
+        computed reports how many bars each indicator actually had to process.
+    """
+    try:
+        symbol_list = _parse_symbols(symbols, INDICATORS_MAX_SYMBOLS)
+        try:
+            indicator_list = parse_indicators(indicators)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        results = await asyncio.gather(
+            *(_symbol_indicators(symbol, period, interval, indicator_list, points) for symbol in symbol_list),
+            return_exceptions=True
+        )
+        
+        data = []
+        for symbol, result in zip(symbol_list, results):
+            if isinstance(result, HTTPException):
+                result = {"symbol": symbol, "error": result.detail}
+            elif isinstance(result, Exception):
+                result = {"symbol": symbol, "error": str(result)}
+            data.append(result)
+        
+        return {"period": period, "interval": interval, "data": data}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing indicators: {str(e)}")
+
+
+def _portfolio_values(holdings: list, last_prices: np.ndarray) -> np.ndarray:
+    """Position values used as weights: explicit weights, shares at the last close, or equal"""
+    if all(h.weight is None and h.shares is None for h in holdings):
+        return np.ones(len(holdings))
+    if all(h.weight is not None and h.shares is None for h in holdings):
+        return np.array([h.weight for h in holdings], dtype=float)
+    if all(h.shares is not None and h.weight is None for h in holdings):
+        return np.array([h.shares for h in holdings], dtype=float) * last_prices
+    raise HTTPException(status_code=400, detail="Give either a weight or a number of shares for every holding, not a mix")
+
+
+@router.post("/portfolio/analytics")
+async def get_portfolio_analytics(request: PortfolioRequest):
+    """
+    Get risk and return analytics for a portfolio
+    
+    Args:
+        request: Holdings (symbol plus weight or shares; equal weights if neither is
+            given), benchmark symbol, period (1mo to 10y, ytd, max), interval
+            (1d, 1wk, 1mo), and whether to include covariance/correlation matrices
+    
+    Returns:
+        Per-holding and portfolio total/annualized return, annualized volatility,
+        beta against the benchmark and maximum drawdown, plus the annualized
+        covariance and correlation matrices. History for all holdings is read from
+        the local history store in one pass, with one batched download for
+        whatever is missing or stale.
+    """
+    try:
+        if request.interval not in PERIODS_PER_YEAR:
+            raise HTTPException(status_code=400, detail=f"Interval must be one of: {', '.join(PERIODS_PER_YEAR)}")
+        if not history_store.supports(request.period, request.interval):
+            raise HTTPException(status_code=400, detail=f"Unsupported period: {request.period}")
+        
+        symbols = [h.symbol.strip().upper() for h in request.holdings]
+        if not symbols:
+            raise HTTPException(status_code=400, detail="No holdings given")
+        if len(symbols) > PORTFOLIO_MAX_SYMBOLS:
+            raise HTTPException(status_code=400, detail=f"Too many holdings: {len(symbols)} given, limit is {PORTFOLIO_MAX_SYMBOLS}")
+        if len(set(symbols)) != len(symbols):
+            raise HTTPException(status_code=400, detail="Each symbol may only appear once")
+        benchmark = request.benchmark.strip().upper()
+        
+        bars, store = await history_store.history_many(
+            list(dict.fromkeys(symbols + [benchmark])), request.period, request.interval
+        )
+        if benchmark not in bars:
+            raise HTTPException(status_code=404, detail=f"No historical data found for benchmark: {benchmark}")
+        
+        available = [i for i, symbol in enumerate(symbols) if symbol in bars]
+        if not available:
+            raise HTTPException(status_code=404, detail="No historical data found for any holding")
+        held = [symbols[i] for i in available]
+        
+        aligned = align_closes(bars, held + [benchmark])
+        closes = aligned["closes"]
+        if len(closes) < 3:
+            raise HTTPException(status_code=404, detail="Not enough overlapping history across holdings")
+        
+        values = _portfolio_values([request.holdings[i] for i in available], closes[-1, :-1])
+        if values.sum() <= 0:
+            raise HTTPException(status_code=400, detail="Holding weights must add up to a positive value")
+        weights = values / values.sum()
+        
+        metrics = portfolio_analytics(closes[:, :-1], weights, closes[:, -1], PERIODS_PER_YEAR[request.interval])
+        dates = np.datetime_as_string(aligned["days"][[0, -1]].astype('datetime64[D]'))
+        
+        response = {
+            "period": request.period,
+            "interval": request.interval,
+            "benchmark": benchmark,
+            "start": str(dates[0]),
+            "end": str(dates[1]),
+            "observations": metrics["observations"],
+            "store": {status: list(store.values()).count(status) for status in set(store.values())},
+            "portfolio": {key: round(float(value), 6) for key, value in metrics["portfolio"].items()},
+            "benchmarkMetrics": {key: round(float(value), 6) for key, value in metrics["benchmark"].items()},
+            "holdings": [
+                {
+                    "symbol": symbol,
+                    "weight": round(float(weights[i]), 6),
+                    **{key: round_array(metrics[key][i]) for key in ("totalReturn", "annualizedReturn", "annualizedVolatility", "beta", "maxDrawdown")}
+                }
+                for i, symbol in enumerate(held)
+            ],
+            "missing": [symbol for symbol in symbols if symbol not in bars]
+        }
+        if request.matrices:
+            response["symbols"] = held
+            response["covariance"] = round_array(metrics["covariance"])
+            response["correlation"] = round_array(metrics["correlation"])
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing portfolio analytics: {str(e)}")
+
+
+screener = Screener(
+    universe=lambda: load_universe(SCREENER_UNIVERSE_FILE),
+    # Screener prices stay in the screener; only quoted symbols go into the quote cache
+    fetch_prices=lambda symbols: _download_prices(symbols, timeout=60, pool=screener_executor),
+    metadata=metadata_store,
+    load_metadata=lambda symbol: metadata_store.load(symbol, pool=screener_executor),
+    interval=SCREENER_REFRESH_INTERVAL,
+    chunk_size=SCREENER_CHUNK_SIZE,
+    metadata_batch=SCREENER_METADATA_BATCH,
+    metadata_concurrency=SCREENER_METADATA_CONCURRENCY,
+    background=SCREENER_BACKGROUND_REFRESH,
+)
+
+
+@router.get("/screener")
+async def screen_stocks(
+    filters: str = "",
+    sort: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    Screen the symbol universe by quote and company fields
+    
+    Args:
+        filters: Comma-separated conditions on price, previousClose, change, changePercent,
+            volume, marketCap (>, >=, <, <=, =, !=) or sector, industry, exchange, currency,
+            quoteType (= or !=, alternatives separated by |),
+            e.g. 'sector=Technology,marketCap>1e10,changePercent<-3'
+        sort: Numeric field to sort by, prefixed with '-' for descending (e.g. '-marketCap')
+        limit: Maximum number of results
+    
+    Returns:
+        Matching stocks, best first when sorted. Results come from a snapshot of the
+        universe refreshed in the background; asOf tells how old it is. complete is
+        false while the first round of prices is still loading, and fields not
+        loaded yet are null.
+    """
+    try:
+        try:
+            conditions = parse_filters(filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        descending = bool(sort) and sort.startswith('-')
+        sort_field = sort.lstrip('-+') if sort else None
+        if sort_field is not None and sort_field not in NUMERIC_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Cannot sort by '{sort_field}', expected one of: {', '.join(NUMERIC_FIELDS)}")
+        
+        snapshot = await screener.snapshot()
+        mask = snapshot.mask(conditions)
+        indices = snapshot.select(mask, sort_field, descending, limit)
+        
+        return {
+            "asOf": datetime.fromtimestamp(snapshot.created_at).isoformat(),
+            "complete": snapshot.complete,
+            "universe": len(snapshot),
+            "matched": int(mask.sum()),
+            "fields": list(NUMERIC_FIELDS + CATEGORY_FIELDS),
+            "data": snapshot.rows(indices)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error screening stocks: {str(e)}")
@@ -0,0 +1,166 @@
+import bisect
+import csv
+import os
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Words that say nothing about which company is meant
+STOP_WORDS = {'inc', 'corp', 'corporation', 'co', 'company', 'ltd', 'limited', 'plc', 'the', 'group', 'holdings', 'sa', 'ag', 'nv'}
+MIN_FUZZY_SCORE = 0.6
+# What a ticker can look like, e.g. AAPL, BRK-B, RELIANCE.NS, ^GSPC, EURUSD=X
+TICKER_PATTERN = re.compile(r'^\^?[A-Za-z0-9]{1,10}([.\-=][A-Za-z0-9]{1,5})?$')
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'[^a-z0-9. ]+', ' ', text.lower()).strip()
+
+
+def _tokens(name: str) -> List[str]:
+    return [token for token in _normalize(name).split() if token not in STOP_WORDS]
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SymbolIndex:
+    """
+    In-memory symbol and company-name index for typeahead search.
+
+    Prefix lookups use bisect over sorted keys (symbols and every word of the
+    company name). Typos are handled by a trigram inverted index that narrows
+    the candidates before scoring them. New symbols can be added at any time
+    without rebuilding.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._keys: List[Tuple[str, str]] = []
+        self._trigrams: Dict[str, Set[str]] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, symbol: str, name: str, exchange: Optional[str] = None, **extra: Any):
+        for key in self._add(symbol, name, exchange, **extra):
+            bisect.insort(self._keys, key)
+
+    def _add(self, symbol: str, name: str, exchange: Optional[str] = None, **extra: Any) -> List[Tuple[str, str]]:
+        """Record the entry and return the sorted keys it still needs"""
+        symbol = symbol.upper()
+        existing = self.entries.get(symbol)
+        if existing is not None and existing['name'] == name:
+            existing.update({k: v for k, v in extra.items() if v})
+            if exchange:
+                existing['exchange'] = exchange
+            return []
+        if existing is not None:
+            self._remove_keys(symbol, existing['name'])
+
+        self.entries[symbol] = {'symbol': symbol, 'name': name, 'exchange': exchange, **extra}
+        for gram in self._grams(symbol, name):
+            self._trigrams.setdefault(gram, set()).add(symbol)
+        return [(key, symbol) for key in self._index_keys(symbol, name)]
+
+    def add_many(self, rows: Iterable[Dict[str, Any]]):
+        # One sort for the whole batch instead of an insort per key
+        keys = []
+        for row in rows:
+            if row.get('symbol') and row.get('name'):
+                keys.extend(self._add(**row))
+        if keys:
+            self._keys = sorted(self._keys + keys)
+
+    def _index_keys(self, symbol: str, name: str) -> Set[str]:
+        return {symbol.lower(), _normalize(name)} | set(_tokens(name))
+
+    def _grams(self, symbol: str, name: str) -> Set[str]:
+        return _trigrams(symbol.lower()) | _trigrams(' '.join(_tokens(name)))
+
+    def _remove_keys(self, symbol: str, name: str):
+        for key in self._index_keys(symbol, name):
+            position = bisect.bisect_left(self._keys, (key, symbol))
+            if position < len(self._keys) and self._keys[position] == (key, symbol):
+                del self._keys[position]
+        for gram in self._grams(symbol, name):
+            self._trigrams.get(gram, set()).discard(symbol)
+
+    def _prefix_matches(self, prefix: str) -> Dict[str, str]:
+        """Map each symbol with a key starting with prefix to its shortest such key"""
+        matches: Dict[str, str] = {}
+        position = bisect.bisect_left(self._keys, (prefix, ''))
+        while position < len(self._keys) and self._keys[position][0].startswith(prefix):
+            key, symbol = self._keys[position]
+            if symbol not in matches or len(key) < len(matches[symbol]):
+                matches[symbol] = key
+            position += 1
+        return matches
+
+    def _score(self, query: str, symbol: str, key: Optional[str]) -> float:
+        entry = self.entries[symbol]
+        if query == symbol.lower():
+            return 100.0
+        if key is not None:
+            if key == symbol.lower():
+                return 90.0 - len(symbol)
+            # Whole-name and first-word matches beat a match on a later word
+            first_word = (_tokens(entry['name']) or [''])[0]
+            bonus = 10.0 if key in (first_word, _normalize(entry['name'])) else 0.0
+            return 60.0 + bonus - min(len(key) - len(query), 20) * 0.5
+        target = ' '.join(_tokens(entry['name']))
+        return 50.0 * max(
+            SequenceMatcher(None, query, symbol.lower()).ratio(),
+            SequenceMatcher(None, query, target[:len(query) + 3]).ratio(),
+        )
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        query = _normalize(query)
+        if not query:
+            return []
+
+        scored = {symbol: self._score(query, symbol, key) for symbol, key in self._prefix_matches(query).items()}
+
+        if len(scored) < limit and len(query) >= 3:
+            # Fuzzy fallback: candidates sharing the most trigrams with the query
+            counts: Dict[str, int] = {}
+            for gram in _trigrams(query):
+                for symbol in self._trigrams.get(gram, ()):
+                    counts[symbol] = counts.get(symbol, 0) + 1
+            candidates = sorted(counts, key=counts.get, reverse=True)[:limit * 5]
+            for symbol in candidates:
+                if symbol not in scored:
+                    score = self._score(query, symbol, None)
+                    if score >= 50.0 * MIN_FUZZY_SCORE:
+                        scored[symbol] = score
+
+        ranked = sorted(scored.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [{**self.entries[symbol], 'score': round(score, 1)} for symbol, score in ranked]
+
+    def absorb(self, other: "SymbolIndex"):
+        """Take over the entries of an index built elsewhere, keeping symbols added here that it lacks"""
+        added_here = [entry for symbol, entry in self.entries.items() if symbol not in other.entries]
+        self.entries, self._keys, self._trigrams = other.entries, other._keys, other._trigrams
+        self.add_many(added_here)
+
+    def load_listing(self, path: str) -> int:
+        """Add every row of a CSV listing with symbol, name and exchange columns"""
+        if not os.path.exists(path):
+            return 0
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = [
+                {'symbol': row['symbol'], 'name': row['name'], 'exchange': row.get('exchange') or None}
+                for row in csv.DictReader(f)
+            ]
+        self.add_many(rows)
+        return len(rows)
+
+
+symbol_index = SymbolIndex()
+SYMBOL_LISTING_FILE = os.getenv("SYMBOL_LISTING_FILE", "./data/symbols.csv")
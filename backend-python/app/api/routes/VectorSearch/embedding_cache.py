@@ -0,0 +1,138 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+from ...utils.sqlite_connections import ThreadLocalConnections
+
+load_dotenv()
+genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+EMBEDDING_MODEL = "models/embedding-001"
+SPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Key form of a query: case, surrounding punctuation and repeated whitespace don't change its meaning"""
+    return SPACE_PATTERN.sub(' ', query).strip().lower().rstrip('?!. ')
+
+
+def _embed_upstream(texts: List[str]) -> List[List[float]]:
+    # A list is sent as batch requests of up to 100 texts each, not one request per text
+    return genai.embed_content(model=EMBEDDING_MODEL, content=texts)["embedding"]
+
+
+class EmbeddingCache:
+    """
+    Query embeddings by normalized query text, in memory and in SQLite.
+
+    The most recently used max_entries vectors stay in an in-process LRU; the
+    SQLite table is shared by every worker and survives restarts, so a query
+    is embedded once per model rather than once per request. Vectors are
+    stored as float32, which is far more precision than similarity ranking
+    needs.
+    """
+
+    def __init__(self, path: str, model: str = EMBEDDING_MODEL, max_entries: int = 10000):
+        self.path = path
+        self.model = model
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = ThreadLocalConnections(
+            path,
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)",
+            synchronous="NORMAL",
+        )
+
+    def _key(self, normalized: str) -> str:
+        return hashlib.sha1(f"{self.model}\n{normalized}".encode('utf-8')).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        conn = self._db.connect()
+        # Stay under SQLite's limit on bound parameters
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, vector FROM query_embeddings WHERE key IN ({','.join('?' * len(chunk))})", tuple(chunk)
+            ).fetchall()
+            for key, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def _save(self, vectors: Dict[str, List[float]]):
+        now = time.time()
+        with self._db.connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in vectors.items()]
+            )
+
+    def embed_many(self, queries: List[str], upstream: bool = True) -> List[Optional[List[float]]]:
+        """
+        Embeddings of queries, in order.
+
+        Memory is checked first, then SQLite in one query, and whatever is
+        still missing is embedded in one batched upstream call. Repeated
+        queries in the list are looked up and embedded once. The key is the
+        normalized query, but a miss embeds the query as written, since case
+        can matter to the model (tickers, for one). With upstream False,
+        queries that are not cached come back as None instead.
+        """
+        keys = [self._key(normalize_query(q)) for q in queries]
+        vectors: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[key] = self._memory[key]
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing:
+            stored = self._load(missing)
+            for key, vector in stored.items():
+                self._remember(key, vector)
+            vectors.update(stored)
+
+        texts: Dict[str, str] = {}
+        for key, query in zip(keys, queries):
+            if key not in vectors:
+                texts.setdefault(key, query.strip())
+        with self._lock:
+            self.hits += len(keys) - len(texts)
+            self.misses += len(texts)
+        if texts and upstream:
+            embedded = dict(zip(texts, _embed_upstream(list(texts.values()))))
+            self._save(embedded)
+            for key, vector in embedded.items():
+                self._remember(key, vector)
+            vectors.update(embedded)
+
+        return [vectors.get(key) for key in keys]
+
+    def embed(self, query: str) -> List[float]:
+        return self.embed_many([query])[0]
+
+
+embedding_cache = EmbeddingCache(
+    path=os.getenv("EMBEDDING_CACHE_DB", "./db/embeddings.sqlite3"),
+    max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000")),
+)
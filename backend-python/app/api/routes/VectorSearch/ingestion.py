@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import google.generativeai as genai
+
+from .embedding_cache import EMBEDDING_MODEL
+from .lexical_index import bump_content_version
+
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.jsonl')
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+# (id, text, metadata) of one chunk as stored in the collection
+Chunk = Tuple[str, str, Dict[str, Any]]
+
+
+def embed_documents(texts: List[str]) -> List[List[float]]:
+    # Same model as the query embeddings, sent as batch requests of up to 100 texts
+    return genai.embed_content(model=EMBEDDING_MODEL, content=texts)["embedding"]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def iter_documents(directory: str) -> Iterator[Tuple[str, str]]:
+    """
+    (document id, text) for every supported file under directory, in path order.
+
+    A .txt or .md file is one document named by its relative path. A .jsonl
+    file holds one document per line with a "text" field and an optional
+    "id"; lines without an id are named by path and line number.
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(SUPPORTED_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory).replace(os.sep, '/')
+            with open(path, encoding='utf-8') as f:
+                if not name.endswith('.jsonl'):
+                    yield relative, f.read()
+                    continue
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    yield str(entry.get('id') or f"{relative}:{line_number}"), entry['text']
+
+
+def _split_long(paragraph: str, max_chars: int) -> List[str]:
+    """Pieces of at most max_chars, cut between sentences where possible"""
+    pieces, current = [], ''
+    for sentence in SENTENCE_PATTERN.split(paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, max_chars: int = 1000, overlap: int = 150) -> List[str]:
+    """
+    Split text into chunks of about max_chars, packing whole paragraphs where they fit.
+
+    Each chunk after the first starts with the last overlap characters of the
+    one before, so a passage cut at a boundary is still found whole in one
+    of them.
+    """
+    pieces = []
+    for paragraph in PARAGRAPH_PATTERN.split(text.strip()):
+        paragraph = paragraph.strip()
+        if paragraph:
+            pieces.extend(_split_long(paragraph, max_chars) if len(paragraph) > max_chars else [paragraph])
+
+    chunks, current = [], ''
+    for piece in pieces:
+        if current and len(current) + 2 + len(piece) > max_chars:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap else ''
+            # Start the overlap on a word boundary
+            tail = tail[tail.find(' ') + 1:] if ' ' in tail else tail
+            current = f"{tail}\n\n{piece}" if tail else piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def iter_chunks(documents: Iterable[Tuple[str, str]], max_chars: int = 1000, overlap: int = 150) -> Iterator[Chunk]:
+    """Chunks of each document; a document that fits in one chunk keeps its own id"""
+    for doc_id, text in documents:
+        chunks = chunk_text(text, max_chars, overlap)
+        for number, chunk in enumerate(chunks):
+            chunk_id = doc_id if len(chunks) == 1 else f"{doc_id}#{number}"
+            yield chunk_id, chunk, {"source": doc_id, "chunk": number, "content_hash": content_hash(chunk)}
+
+
+def _batches(chunks: Iterable[Chunk], size: int) -> Iterator[List[Chunk]]:
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _is_rate_limited(e: Exception) -> bool:
+    message = str(e)
+    return "429" in message or "quota" in message.lower() or "exhausted" in message.lower()
+
+
+class Ingestor:
+    """
+    Incremental, batched loading of chunks into a Chroma collection.
+
+    Chunks are read lazily and looked up in the collection a batch at a time;
+    only those whose content hash differs from the stored one are embedded,
+    so re-running over an unchanged corpus costs one metadata read per batch
+    and no embedding calls. Changed chunks are embedded batch_size at a time
+    by up to concurrency workers and upserted batch by batch.
+
+    Embedding requests start at most requests_per_minute per minute. A
+    rate-limit error pauses every worker, with exponential backoff and
+    jitter, before the batch is retried; other errors are retried too and
+    the batch is counted as failed after max_retries attempts (at least one).
+
+    Once everything is read, stored chunks of the documents read that the
+    run did not produce, e.g. the tail of a document that got shorter, are
+    deleted. Documents with a failed batch keep theirs until the next run.
+
+    A run or prune that changed anything bumps the collection's content
+    version, so running servers reload their lexical index.
+    """
+
+    def __init__(
+        self,
+        collection,
+        embed: Callable[[List[str]], List[List[float]]] = embed_documents,
+        batch_size: int = 100,
+        concurrency: int = 4,
+        requests_per_minute: float = 100.0,
+        max_retries: int = 5,
+    ):
+        self.collection = collection
+        self.embed = embed
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.request_interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self.max_retries = max(max_retries, 1)
+        self.stats = {
+            "chunks": 0, "unchanged": 0, "embedded": 0, "failed": 0, "removed": 0, "requests": 0, "rate_limited": 0
+        }
+        self._failed_sources: Set[str] = set()
+        self._next_request = 0.0
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _changed(self, batch: List[Chunk]) -> List[Chunk]:
+        stored = self.collection.get(ids=[chunk_id for chunk_id, _, _ in batch], include=["metadatas"])
+        hashes = {
+            chunk_id: (metadata or {}).get("content_hash")
+            for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+        }
+        return [chunk for chunk in batch if hashes.get(chunk[0]) != chunk[2]["content_hash"]]
+
+    async def _wait_turn(self):
+        """Space request starts by request_interval and hold them while rate limited"""
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request, self._paused_until)
+            self._next_request = start + self.request_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries):
+            await self._wait_turn()
+            self.stats["requests"] += 1
+            try:
+                return await asyncio.to_thread(self.embed, texts)
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                delay = min(60.0, 2.0 ** attempt) * (1 + random.random())
+                if _is_rate_limited(e):
+                    self.stats["rate_limited"] += 1
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                else:
+                    await asyncio.sleep(delay)
+                print(f"Embedding error (attempt {attempt + 1}, retrying): {str(e)[:200]}")
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            try:
+                embeddings = await self._embed([text for _, text, _ in batch])
+                await asyncio.to_thread(
+                    self.collection.upsert,
+                    ids=[chunk_id for chunk_id, _, _ in batch],
+                    documents=[text for _, text, _ in batch],
+                    embeddings=embeddings,
+                    metadatas=[metadata for _, _, metadata in batch]
+                )
+                self.stats["embedded"] += len(batch)
+            except Exception as e:
+                print(f"Ingestion error for {batch[0][0]}..{batch[-1][0]}: {str(e)[:200]}")
+                self.stats["failed"] += len(batch)
+                self._failed_sources.update(metadata["source"] for _, _, metadata in batch)
+
+    def _remove_stale(self, produced: Dict[str, Set[str]]):
+        """Delete stored chunks of the given documents whose ids are not among those produced for them"""
+        sources = [source for source in produced if source not in self._failed_sources]
+        for i in range(0, len(sources), 100):
+            group = sources[i:i + 100]
+            stored = self.collection.get(where={"source": {"$in": group}}, include=["metadatas"])
+            stale = [
+                chunk_id for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+                if chunk_id not in produced[metadata["source"]]
+            ]
+            if stale:
+                self.collection.delete(ids=stale)
+                self.stats["removed"] += len(stale)
+
+    async def run(self, chunks: Iterable[Chunk], seen: Optional[Set[str]] = None) -> Dict[str, int]:
+        """Load chunks and return counts; ids read are added to seen, if given"""
+        # A bounded queue keeps reading only a few batches ahead of embedding
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        produced: Dict[str, Set[str]] = {}
+        try:
+            try:
+                for batch in _batches(chunks, self.batch_size):
+                    self.stats["chunks"] += len(batch)
+                    for chunk_id, _, metadata in batch:
+                        produced.setdefault(metadata["source"], set()).add(chunk_id)
+                    if seen is not None:
+                        seen.update(chunk_id for chunk_id, _, _ in batch)
+                    changed = await asyncio.to_thread(self._changed, batch)
+                    self.stats["unchanged"] += len(batch) - len(changed)
+                    if changed:
+                        await queue.put(changed)
+            finally:
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            await asyncio.to_thread(self._remove_stale, produced)
+        finally:
+            if self.stats["embedded"] or self.stats["removed"]:
+                bump_content_version(self.collection)
+        return self.stats
+
+    def prune(self, seen: Set[str]) -> int:
+        """Delete stored chunks whose ids were not read in this run; returns how many"""
+        stale = [chunk_id for chunk_id in self.collection.get(include=[])["ids"] if chunk_id not in seen]
+        for i in range(0, len(stale), 1000):
+            self.collection.delete(ids=stale[i:i + 1000])
+        if stale:
+            bump_content_version(self.collection)
+        return len(stale)
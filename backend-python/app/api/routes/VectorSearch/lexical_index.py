@@ -0,0 +1,237 @@
+import math
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..AIChatbot.term_matcher import tokenize
+
+# Words too common to say anything about which document matches
+STOPWORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does', 'for', 'from', 'how', 'i', 'in', 'is',
+    'it', 'its', 'me', 'my', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'what', 'when', 'where', 'which', 'who',
+    'why', 'with', 'you', 'your',
+))
+
+# Collection metadata key that writers change whenever documents change, for readers in other processes
+CONTENT_VERSION_KEY = "content_version"
+
+
+def index_terms(text: str) -> List[str]:
+    return [word for word in tokenize(text) if word not in STOPWORDS]
+
+
+def content_version(metadata: Optional[Dict[str, Any]]) -> Optional[str]:
+    return (metadata or {}).get(CONTENT_VERSION_KEY)
+
+
+def bump_content_version(collection) -> str:
+    """Record in the collection's metadata that its documents changed; returns the new version"""
+    version = uuid.uuid4().hex
+    # Distance settings cannot be passed to modify again, and other keys must be kept
+    metadata = {key: value for key, value in (collection.metadata or {}).items() if not key.startswith('hnsw:')}
+    collection.modify(metadata={**metadata, CONTENT_VERSION_KEY: version})
+    return version
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 index over the documents of a Chroma collection.
+
+    Documents live in numbered slots. Those present at the last rebuild form
+    one block of postings sorted by term (term offsets into arrays of slots
+    and term frequencies), built with a few array sorts rather than a loop
+    per word. Documents upserted since then go into small per-term lists,
+    and both are merged into arrays the first time a term is searched after
+    it changed, so scoring a query is a handful of vectorized additions with
+    no embedding or network call. Replacing or deleting a document only
+    retires its slot, which is left out of those arrays; the block is rebuilt
+    from the live documents once retired slots or later additions make up
+    too large a share of it.
+
+    sync() reloads everything from the collection when its size or content
+    version no longer matches, which picks up documents written by other
+    processes; writers in this process keep the index current through
+    upsert() and delete().
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, sync_interval: float = 60.0):
+        self.k1 = k1
+        self.b = b
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._synced_at = 0.0
+        self.version: Optional[str] = None
+        self._rebuild([])
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def _rebuild(self, documents: List[Tuple[str, str]]):
+        """Index (id, document) pairs from scratch as one sorted block"""
+        documents = list(dict(documents).items())
+        words = [index_terms(document) for _, document in documents]
+        flat = [word for doc_words in words for word in doc_words]
+        lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+
+        self._vocabulary: Dict[str, int] = {word: code for code, word in enumerate(dict.fromkeys(flat))}
+        codes = np.fromiter(map(self._vocabulary.__getitem__, flat), dtype=np.int64, count=len(flat))
+        # Sorting (term, slot) pairs groups postings by term, and runs of equal pairs are term frequencies
+        stride = max(len(documents), 1)
+        pairs = np.sort(codes * stride + np.repeat(np.arange(len(documents), dtype=np.int64), lengths))
+        starts = np.flatnonzero(np.r_[True, pairs[1:] != pairs[:-1]]) if len(pairs) else np.empty(0, dtype=np.int64)
+        self._block_slots = pairs[starts] % stride
+        self._block_frequencies = np.diff(np.r_[starts, len(pairs)]).astype(np.float64)
+        self._block_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(pairs[starts] // stride, minlength=len(self._vocabulary))))
+        )
+        self._block_size = len(documents)
+
+        self._ids: List[str] = [doc_id for doc_id, _ in documents]
+        self._documents: List[Optional[str]] = [document for _, document in documents]
+        self._lengths: List[int] = lengths.tolist()
+        self._slot_of: Dict[str, int] = {doc_id: slot for slot, doc_id in enumerate(self._ids)}
+        self._retired: List[int] = []
+        self._retired_array: Optional[np.ndarray] = None
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._length_array: Optional[np.ndarray] = None
+        self._total_length = int(lengths.sum())
+
+    def _live_documents(self) -> List[Tuple[str, str]]:
+        return [(self._ids[slot], self._documents[slot]) for slot in self._slot_of.values()]
+
+    def _retire(self, doc_id: str):
+        slot = self._slot_of.pop(doc_id, None)
+        if slot is not None:
+            # Its terms' merged arrays still hold the slot and would overstate document frequency
+            for word in set(index_terms(self._documents[slot])):
+                self._arrays.pop(word, None)
+            self._documents[slot] = None
+            self._retired.append(slot)
+            self._retired_array = None
+            self._total_length -= self._lengths[slot]
+
+    def _add(self, doc_id: str, document: str):
+        self._retire(doc_id)
+        slot = len(self._ids)
+        words = index_terms(document)
+        counts: Dict[str, int] = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        for word, count in counts.items():
+            slots, frequencies = self._postings.setdefault(word, ([], []))
+            slots.append(slot)
+            frequencies.append(count)
+            self._arrays.pop(word, None)
+        self._ids.append(doc_id)
+        self._documents.append(document)
+        self._lengths.append(len(words))
+        self._slot_of[doc_id] = slot
+        self._total_length += len(words)
+        self._length_array = None
+
+    def _needs_rebuild(self, adding: int = 0) -> bool:
+        added = len(self._ids) - self._block_size + adding
+        return len(self._retired) > len(self._ids) // 4 or added > max(1000, self._block_size // 10)
+
+    def upsert(self, ids: List[str], documents: List[str]):
+        with self._lock:
+            if self._needs_rebuild(len(ids)):
+                self._rebuild(self._live_documents() + [(doc_id, document or '') for doc_id, document in zip(ids, documents)])
+                return
+            for doc_id, document in zip(ids, documents):
+                self._add(doc_id, document or '')
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._retire(doc_id)
+            if self._needs_rebuild():
+                self._rebuild(self._live_documents())
+
+    def sync(self, collection, read_version: Callable[[], Optional[str]] = lambda: None):
+        """
+        Reload from collection if its document count or content version
+        differs, checking at most every sync_interval. read_version returns
+        the collection's current content version, read fresh from the store.
+        """
+        now = time.monotonic()
+        if self._synced_at and now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        version = read_version()
+        if collection.count() == len(self._slot_of) and version == self.version:
+            return
+        stored = collection.get(include=["documents"])
+        documents = [(doc_id, document or '') for doc_id, document in zip(stored["ids"], stored["documents"])]
+        with self._lock:
+            self._rebuild(documents)
+            self.version = version
+
+    def _term_arrays(self, word: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        arrays = self._arrays.get(word)
+        if arrays is not None:
+            return arrays
+        code = self._vocabulary.get(word)
+        added = self._postings.get(word)
+        if code is None and added is None:
+            return None
+        slots, frequencies = [], []
+        if code is not None:
+            start, end = self._block_offsets[code], self._block_offsets[code + 1]
+            slots.append(self._block_slots[start:end])
+            frequencies.append(self._block_frequencies[start:end])
+        if added is not None:
+            slots.append(np.array(added[0], dtype=np.int64))
+            frequencies.append(np.array(added[1], dtype=np.float64))
+        slots, frequencies = np.concatenate(slots), np.concatenate(frequencies)
+        if self._retired:
+            if self._retired_array is None:
+                self._retired_array = np.array(self._retired, dtype=np.int64)
+            live = ~np.isin(slots, self._retired_array)
+            slots, frequencies = slots[live], frequencies[live]
+        arrays = (slots, frequencies)
+        self._arrays[word] = arrays
+        return arrays
+
+    def search(self, query: str, n_results: int) -> List[Tuple[str, str, float]]:
+        """Best matching (id, document, score) by BM25, best first; empty when no query word is indexed"""
+        with self._lock:
+            live = len(self._slot_of)
+            if not live:
+                return []
+            if self._length_array is None:
+                self._length_array = np.array(self._lengths, dtype=np.float64)
+            average_length = max(self._total_length / live, 1.0)
+
+            matched_slots, contributions = [], []
+            for word in dict.fromkeys(index_terms(query)):
+                arrays = self._term_arrays(word)
+                if arrays is None or not len(arrays[0]):
+                    continue
+                slots, frequencies = arrays
+                idf = math.log(1 + (live - len(slots) + 0.5) / (len(slots) + 0.5))
+                norms = self.k1 * (1 - self.b + self.b * self._length_array[slots] / average_length)
+                matched_slots.append(slots)
+                contributions.append(idf * frequencies * (self.k1 + 1) / (frequencies + norms))
+            if not matched_slots:
+                return []
+
+            # Sum per slot over the matched postings only, so the cost follows the query's terms and not the corpus size
+            slots = np.concatenate(matched_slots)
+            order = np.argsort(slots, kind='stable')
+            slots, contributions = slots[order], np.concatenate(contributions)[order]
+            starts = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+            slots, scores = slots[starts], np.add.reduceat(contributions, starts)
+
+            if len(slots) > n_results:
+                top = np.argpartition(-scores, n_results - 1)[:n_results]
+                slots, scores = slots[top], scores[top]
+            order = np.argsort(-scores, kind='stable')
+            return [
+                (self._ids[slot], self._documents[slot], score)
+                for slot, score in zip(slots[order].tolist(), scores[order].tolist())
+            ]
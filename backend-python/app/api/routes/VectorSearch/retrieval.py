@@ -0,0 +1,142 @@
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from .lexical_index import LexicalIndex, bump_content_version, content_version
+
+load_dotenv()
+
+# Rank offset of reciprocal rank fusion; larger values flatten the difference between top ranks
+RRF_K = 60
+
+
+def fuse_rankings(rankings: List[List[str]], weights: List[float], n_results: int) -> List[str]:
+    """Ids ordered by weighted reciprocal rank fusion of several best-first rankings"""
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.__getitem__, reverse=True)[:n_results]
+
+
+def _is_quota_error(e: Exception) -> bool:
+    message = str(e)
+    return "quota" in message.lower() or "429" in message
+
+
+class HybridRetriever:
+    """
+    Document search over a Chroma collection combining BM25 and vector similarity.
+
+    Each query gets up to candidates results from the lexical index and from
+    the collection's vector search, merged by reciprocal rank fusion. Rank
+    fusion needs no calibration between BM25 scores and embedding distances,
+    and a document found by both searches rises above one found by either.
+
+    When embeddings are unavailable the lexical results are returned alone.
+    After a quota error, queries stay lexical-only (apart from those with a
+    cached embedding) for cooldown seconds instead of waiting on an API that
+    is known to refuse them. Every result reports which mode produced it.
+
+    read_metadata returns the collection's metadata as currently stored (the
+    collection object keeps what it had when it was fetched), so the lexical
+    index notices documents re-written by other processes.
+    """
+
+    def __init__(
+        self,
+        collection,
+        index: LexicalIndex,
+        embed_many: Callable[..., List[Optional[List[float]]]],
+        lexical_weight: float = 1.0,
+        candidates: int = 20,
+        cooldown: float = 60.0,
+        read_metadata: Optional[Callable[[], Optional[dict]]] = None,
+    ):
+        self.collection = collection
+        self.read_metadata = read_metadata or (lambda: collection.metadata)
+        self.index = index
+        self.embed_many = embed_many
+        self.lexical_weight = lexical_weight
+        self.candidates = candidates
+        self.cooldown = cooldown
+        self._embeddings_down_until = 0.0
+
+    def upsert(self, ids: List[str], documents: List[str], embeddings: List[List[float]], metadatas: Optional[List[dict]] = None):
+        """Write documents to the collection and the lexical index together"""
+        self.collection.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+        self.index.upsert(ids, documents)
+        # This index is already current; the new version is for indexes in other processes
+        self.index.version = bump_content_version(self.collection)
+
+    def _vector_rankings(self, queries: List[str], n_results: int) -> List[Optional[Dict[str, str]]]:
+        """
+        Best-first id -> document of the nearest documents to each query.
+
+        During the cooldown only cached embeddings are used, and queries
+        without one get None rather than holding back the rest of the batch.
+        """
+        embeddings = self.embed_many(queries, upstream=time.monotonic() >= self._embeddings_down_until)
+        embedded = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        rankings: List[Optional[Dict[str, str]]] = [None] * len(queries)
+        if embedded:
+            result = self.collection.query(
+                query_embeddings=[embeddings[i] for i in embedded], n_results=n_results, include=["documents"]
+            )
+            for i, ids, documents in zip(embedded, result["ids"], result["documents"]):
+                rankings[i] = dict(zip(ids, documents))
+        return rankings
+
+    def search_many(self, queries: List[str], n_results: int = 3) -> List[Dict[str, Any]]:
+        """Documents and retrieval mode for each query, with an error where neither search could run"""
+        try:
+            self.index.sync(self.collection, lambda: content_version(self.read_metadata()))
+        except Exception as e:
+            print(f"Lexical index sync error: {str(e)}")
+
+        candidates = max(self.candidates, n_results)
+        vector: List[Optional[Dict[str, str]]] = [None] * len(queries)
+        error = None
+        try:
+            vector = self._vector_rankings(queries, candidates)
+        except Exception as e:
+            print(f"Vector search error: {str(e)}")
+            error = str(e)
+            if _is_quota_error(e):
+                self._embeddings_down_until = time.monotonic() + self.cooldown
+        else:
+            if time.monotonic() < self._embeddings_down_until:
+                # Only queries left without a cached embedding have no vector ranking
+                error = "Embedding quota exceeded, waiting out the cooldown"
+
+        results = []
+        for i, query in enumerate(queries):
+            lexical = {doc_id: document for doc_id, document, _ in self.index.search(query, candidates)}
+            if vector[i] is None:
+                if lexical or not error:
+                    results.append({"documents": list(lexical.values())[:n_results], "mode": "lexical"})
+                else:
+                    results.append({"documents": [], "mode": "unavailable", "error": error})
+            elif not lexical:
+                results.append({"documents": list(vector[i].values())[:n_results], "mode": "vector"})
+            else:
+                documents = {**vector[i], **lexical}
+                ranked = fuse_rankings([list(vector[i]), list(lexical)], [1.0, self.lexical_weight], n_results)
+                results.append({"documents": [documents[doc_id] for doc_id in ranked], "mode": "hybrid"})
+        return results
+
+
+def create_retriever(
+    collection, embed_many: Callable[..., List[Optional[List[float]]]], read_metadata: Optional[Callable[[], Optional[dict]]] = None
+) -> HybridRetriever:
+    return HybridRetriever(
+        collection,
+        LexicalIndex(sync_interval=float(os.getenv("LEXICAL_SYNC_INTERVAL", "60"))),
+        embed_many,
+        lexical_weight=float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0")),
+        candidates=int(os.getenv("HYBRID_CANDIDATES", "20")),
+        cooldown=float(os.getenv("EMBEDDING_COOLDOWN", "60")),
+        read_metadata=read_metadata,
+    )
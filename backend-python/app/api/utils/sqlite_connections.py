@@ -0,0 +1,38 @@
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+
+class ThreadLocalConnections:
+    """
+    One SQLite connection per thread to a database in WAL mode, kept open.
+
+    Opening a connection costs more than the queries, and a connection must
+    not be shared between threads, so each thread that asks gets its own. The
+    first one creates the file's directory, switches the database to WAL and
+    runs schema. synchronous, if given, is set on every connection.
+    """
+
+    def __init__(self, path: str, schema: str, synchronous: Optional[str] = None):
+        self.path = path
+        self.schema = schema
+        self.synchronous = synchronous
+        self._initialized = False
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        if self.synchronous:
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.schema)
+            self._initialized = True
+        self._local.conn = conn
+        return conn
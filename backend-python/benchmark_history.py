@@ -0,0 +1,46 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.api.routes.StockData.history import downsample_lttb, downsample_ohlc, serialize_history
+
+POINT_COUNTS = [1_000, 10_000, 100_000, 1_000_000]
+MAX_POINTS = 500
+
+
+def make_history(points):
+    """Build a synthetic minute-bar OHLCV frame shaped like normalize_history output"""
+    index = pd.date_range("2015-01-02 09:30", periods=points, freq="min", tz="America/New_York", name="date")
+    close = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.1, points))
+    return pd.DataFrame({
+        "open": close + 0.05,
+        "high": close + 0.2,
+        "low": close - 0.2,
+        "close": close,
+        "volume": np.full(points, 1000.0)
+    }, index=index)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    """Compare serialization and downsampling cost against the number of points"""
+    print(f"{'points':>10} {'records ms':>11} {'lttb ms':>9} {'ohlc ms':>9} {'full KB':>9} {'lttb KB':>9}")
+    for points in POINT_COUNTS:
+        frame = make_history(points)
+        records, records_ms = timed(serialize_history, frame)
+        sampled, lttb_ms = timed(downsample_lttb, frame, MAX_POINTS)
+        _, ohlc_ms = timed(downsample_ohlc, frame, MAX_POINTS)
+        full_kb = len(json.dumps(records)) / 1024
+        lttb_kb = len(json.dumps(serialize_history(sampled))) / 1024
+        print(f"{points:>10} {records_ms:>11.1f} {lttb_ms:>9.1f} {ohlc_ms:>9.1f} {full_kb:>9.0f} {lttb_kb:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
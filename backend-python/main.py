@@ -1,11 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel
+from typing import List
 import uvicorn
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes.AIChatbot import chatbot
 from app.api.routes.SentimentAnalysis import sentiment
 from app.api.routes.StockData import stock_data
+from app.api.routes.VectorSearch.embedding_cache import embedding_cache
+from app.api.routes.VectorSearch.retrieval import create_retriever
 
 
 from chromadb import PersistentClient
@@ -21,9 +26,21 @@ genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
 chroma_client = PersistentClient(path="./db")
 collection = chroma_client.get_or_create_collection(name="fintech_docs")
+# Fetched fresh so the lexical index sees seed.py runs from other processes
+retriever = create_retriever(
+    collection, embedding_cache.embed_many, lambda: chroma_client.get_collection(name="fintech_docs").metadata
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm screener prices and company fields before the first /screener request (SCREENER_BACKGROUND_REFRESH only)
+    stock_data.screener.start()
+    yield
+    stock_data.screener.stop()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 origins = [
@@ -49,38 +66,57 @@ app.include_router(stock_data.router, prefix="/api/v1/stocks", tags=["stocks"])
 def root():
     return {"message": "Welcome to FinTechFore Python Backend", "status": "Ok"}
 
-# 🔍 Chroma vector search using Gemini embeddings
+CHROMA_BATCH_MAX_QUERIES = int(os.getenv("CHROMA_BATCH_MAX_QUERIES", "100"))
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    n_results: int = 3
+
+
+def _search_unavailable(error_msg: str) -> List[str]:
+    print(f"Chroma search error: {error_msg}")  # Log the error for debugging
+    
+    # Check if it's a quota exceeded error
+    if "quota" in error_msg.lower() or "429" in error_msg:
+        # Return a default response when quota is exceeded
+        return ["We're currently experiencing high demand. Please try again later or check back soon."]
+    else:
+        # Provide a more helpful message for other errors
+        return [f"Search temporarily unavailable: {error_msg[:100]}..."]
+
+# 🔍 Chroma search: Gemini embeddings fused with BM25, or BM25 alone when embeddings are unavailable
 @app.get("/chroma-search")
-def chroma_search(q: str):
+def chroma_search(q: str, response: Response):
+    try:
+        result = retriever.search_many([q], n_results=3)[0]
+    except Exception as e:
+        return _search_unavailable(str(e))
+    
+    # The body stays a plain list of documents; the mode that produced it goes in a header
+    response.headers["X-Retrieval-Mode"] = result["mode"]
+    if "error" in result:
+        return _search_unavailable(result["error"])
+    return result["documents"]
+
+# Many searches at once: one embedding call for the uncached queries and one collection query
+@app.post("/chroma-search/batch")
+def chroma_search_batch(request: BatchSearchRequest):
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(request.queries) > CHROMA_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {CHROMA_BATCH_MAX_QUERIES} queries per request")
+    if not 1 <= request.n_results <= 20:
+        raise HTTPException(status_code=400, detail="n_results must be between 1 and 20")
     try:
-        # Try to generate embedding using Google API
-        embedding_result = genai.embed_content(
-            model="models/embedding-001",
-            content=q
-        )
-        
-        if "embedding" not in embedding_result:
-            raise HTTPException(status_code=500, detail="Failed to generate embedding")
-            
-        embedding = embedding_result["embedding"]
-        result = collection.query(query_embeddings=[embedding], n_results=3)
-        
-        # Return documents if they exist, otherwise return empty list
-        if "documents" in result and result["documents"]:
-            return result["documents"][0] if len(result["documents"]) > 0 else []
-        else:
-            return []
+        results = retriever.search_many(request.queries, n_results=request.n_results)
     except Exception as e:
-        error_msg = str(e)
-        print(f"Chroma search error: {error_msg}")  # Log the error for debugging
-        
-        # Check if it's a quota exceeded error
-        if "quota" in error_msg.lower() or "429" in error_msg:
-            # Return a default response when quota is exceeded
-            return ["We're currently experiencing high demand. Please try again later or check back soon."]
-        else:
-            # Provide a more helpful message for other errors
-            return [f"Search temporarily unavailable: {str(e)[:100]}..."]
+        message = _search_unavailable(str(e))[0]
+        return [{"query": q, "documents": [], "mode": "unavailable", "error": message} for q in request.queries]
+    for result in results:
+        if "error" in result:
+            result["error"] = _search_unavailable(result["error"])[0]
+    return [{"query": q, **result} for q, result in zip(request.queries, results)]
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -78,6 +78,71 @@ def test_stock_history():
         for i, point in enumerate(result['data'][:3]):
             print(f"  {i+1}. Date: {point['date']}, Close: ${point['close']}")
 
+def test_stock_history_columnar():
+    """Test getting historical stock data as parallel arrays"""
+    print_section("TEST 4b: Stock History (columnar)")
+    
+    symbol = "AAPL"
+    response = requests.get(
+        f"{BASE_URL}/api/v1/stocks/history",
+        params={"symbol": symbol, "period": "1y", "interval": "1d", "format": "columnar"}
+    )
+    
+    data = response.json().get('data', {})
+    print(f"Status Code: {response.status_code}")
+    print(f"Columns: {list(data.keys())}")
+    print(f"Data Points: {len(data.get('timestamps', []))}")
+
+def test_stock_indicators():
+    """Test technical indicators computed server-side"""
+    print_section("TEST 4c: Stock Indicators")
+    
+    response = requests.get(
+        f"{BASE_URL}/api/v1/stocks/indicators",
+        params={"symbols": "AAPL,MSFT", "indicators": "sma:50,rsi,macd", "period": "1y", "points": 3}
+    )
+    
+    print(f"Status Code: {response.status_code}")
+    for item in response.json().get('data', []):
+        print(f"\n{item['symbol']}: computed {item.get('computed')}")
+        for name, fields in item.get('indicators', {}).items():
+            print(f"  {name}: {fields}")
+
+def test_portfolio_analytics():
+    """Test portfolio risk analytics"""
+    print_section("TEST 4d: Portfolio Analytics")
+    
+    payload = {
+        "holdings": [
+            {"symbol": "AAPL", "shares": 10},
+            {"symbol": "MSFT", "shares": 5},
+            {"symbol": "GOOGL", "shares": 8}
+        ],
+        "benchmark": "^GSPC",
+        "period": "5y"
+    }
+    response = requests.post(f"{BASE_URL}/api/v1/stocks/portfolio/analytics", json=payload)
+    
+    data = response.json()
+    print(f"Status Code: {response.status_code}")
+    print(f"Range: {data.get('start')} to {data.get('end')} ({data.get('observations')} returns)")
+    print(f"Portfolio: {json.dumps(data.get('portfolio'), indent=2)}")
+    for holding in data.get('holdings', []):
+        print(f"  {holding['symbol']}: weight {holding['weight']}, beta {holding['beta']}, max drawdown {holding['maxDrawdown']}")
+
+def test_stock_screener():
+    """Test screening the symbol universe"""
+    print_section("TEST 4e: Stock Screener")
+    
+    params = {"filters": "sector=Technology,marketCap>1e10", "sort": "-changePercent", "limit": 5}
+    response = requests.get(f"{BASE_URL}/api/v1/stocks/screener", params=params)
+    
+    data = response.json()
+    print(f"Status Code: {response.status_code}")
+    print(f"Snapshot: {data.get('asOf')} (complete: {data.get('complete')}), {data.get('matched')} of {data.get('universe')} symbols matched")
+    for stock in data.get('data', []):
+        print(f"  {stock['symbol']}: {stock['changePercent']}% (market cap {stock['marketCap']})")
+
 def test_indian_stocks():
     """Test with Indian stocks"""
     print_section("TEST 5: Indian Stocks")
@@ -89,6 +154,35 @@ def test_indian_stocks():
     response = requests.get(f"{BASE_URL}/api/v1/stocks/quotes", params={"symbols": symbols})
     print_response(response, "Indian Stock Quotes")
 
+def test_quote_cache():
+    """Test that repeated quotes are served from the cache"""
+    print_section("TEST 6: Quote Cache")
+    
+    symbol = "AAPL"
+    print(f"\nFetching {symbol} twice")
+    
+    for attempt in range(2):
+        response = requests.get(f"{BASE_URL}/api/v1/stocks/quote", params={"symbol": symbol})
+        cache = response.json().get('cache', {})
+        print(f"  Request {attempt + 1}: metadata={cache.get('metadata')}, price={cache.get('price')}, stats={cache.get('stats')}")
+
+def test_quote_stream():
+    """Test the streaming quote endpoint"""
+    print_section("TEST 7: Quote Stream")
+    
+    symbols = "AAPL,MSFT"
+    print(f"\nReading 2 events for: {symbols}")
+    
+    with requests.get(f"{BASE_URL}/api/v1/stocks/stream", params={"symbols": symbols}, stream=True, timeout=60) as response:
+        events = 0
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data:"):
+                payload = json.loads(line[len("data:"):])
+                print(f"  Event {events + 1}: {[(q['symbol'], q.get('currentPrice')) for q in payload['data']]}")
+                events += 1
+                if events == 2:
+                    break
+
 def main():
     """Run all tests"""
     print("\n" + "🚀"*30)
@@ -109,10 +203,20 @@ def main():
         
         # Test 4: Stock history
         test_stock_history()
+        test_stock_history_columnar()
+        test_stock_indicators()
+        test_portfolio_analytics()
+        test_stock_screener()
         
         # Test 5: Indian stocks
         test_indian_stocks()
         
+        # Test 6: Quote cache
+        test_quote_cache()
+        
+        # Test 7: Quote stream
+        test_quote_stream()
+        
         print_section("✅ ALL TESTS COMPLETED")
         print(f"\nFinished at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         